@@ -0,0 +1,58 @@
+import asyncio
+import json
+import time
+
+from _testing.benchmarks.fake_connections import make_open_connections, bytes_written
+
+from aio_rmq_wss_proxy import SecuredWebsocketServerProtocol
+
+RECEIVERS_AMOUNTS = (1000, 10000, 50000)
+ROUNDS = 5
+
+MESSAGE = {
+    'event': 'data update',
+    'room': 'public room 1',
+    'result': [{'symbol': f'SYM{num}', 'price': 100.5 + num, 'volume': 10 * num} for num in range(20)]
+}
+
+
+async def send_per_client(receivers, message: str):
+    # current path: every receiver encodes and frames the message on its own
+    await asyncio.gather(*[receiver.send(message) for _, receiver in receivers])
+
+
+async def send_prepared(receivers, message: str):
+    prepared_message = SecuredWebsocketServerProtocol.prepare_message(message)
+    await asyncio.gather(*[receiver.send_prepared(prepared_message) for _, receiver in receivers])
+
+
+async def measure(send_method, receivers, message: str) -> float:
+    started = time.perf_counter()
+
+    for _ in range(ROUNDS):
+        await send_method(receivers, message)
+
+    return (time.perf_counter() - started) / ROUNDS
+
+
+async def main():
+    message = json.dumps(MESSAGE)
+
+    print(f'Message size: {len(message)} bytes, rounds: {ROUNDS}')
+    print(f'{"receivers":>10} {"per client, ms":>15} {"prepared, ms":>13} {"speedup":>8}')
+
+    for amount in RECEIVERS_AMOUNTS:
+        receivers = make_open_connections(amount)
+
+        per_client_secs = await measure(send_per_client, receivers, message)
+        written = bytes_written(receivers)
+        prepared_secs = await measure(send_prepared, receivers, message)
+
+        assert bytes_written(receivers) == 2 * written
+
+        print(f'{amount:>10} {per_client_secs * 1000:>15.1f} {prepared_secs * 1000:>13.1f} '
+              f'{per_client_secs / prepared_secs:>7.2f}x')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+import time
+
+from aio_rmq_wss_proxy import JsonCodec, WireCodec
+
+ROUNDS = 20000
+
+PAYLOADS = {
+    # websocket client's command
+    'command': {'event': 'subscribe', 'room': 'public room 1'},
+    # typical RMQ update
+    'update': {'action': 'test update',
+               'data': {'symbol': 'BTC-USDT', 'price': 27123.45, 'volume': 12.5, 'ts': 1697000000123}},
+    # order book like snapshot
+    'snapshot': {'action': 'test update',
+                 'data': {'bids': [[27000.0 - num, 1.5 + num] for num in range(200)],
+                          'asks': [[27001.0 + num, 2.5 + num] for num in range(200)]}},
+}
+
+
+def measure_us(method, arg) -> float:
+    started = time.perf_counter()
+
+    for _ in range(ROUNDS):
+        method(arg)
+
+    return (time.perf_counter() - started) / ROUNDS * 1000000
+
+
+def main():
+    codecs = [JsonCodec(library) for library in JsonCodec.LIBRARIES if JsonCodec.is_available(library)]
+
+    print(f'Rounds: {ROUNDS}, time per call in us')
+    print(f'{"payload":>10} {"library":>8} {"loads(bytes)":>13} {"dumps_bytes":>12} {"dumps":>8}')
+
+    for payload_name, payload in PAYLOADS.items():
+        body = JsonCodec('json').dumps_bytes(payload)
+
+        for codec in codecs:
+            print(f'{payload_name:>10} {codec.library:>8} {measure_us(codec.loads, body):>13.2f} '
+                  f'{measure_us(codec.dumps_bytes, payload):>12.2f} {measure_us(codec.dumps, payload):>8.2f}')
+
+    wire_codecs = [WireCodec(wire_format) for wire_format in WireCodec.FORMATS if WireCodec.is_available(wire_format)]
+
+    print()
+    print('Wire formats of websocket clients, time per call in us')
+    print(f'{"payload":>10} {"format":>8} {"bytes":>8} {"loads":>8} {"dumps_bytes":>12}')
+
+    for payload_name, payload in PAYLOADS.items():
+        for codec in wire_codecs:
+            body = codec.dumps_bytes(payload)
+
+            print(f'{payload_name:>10} {codec.format:>8} {len(body):>8} {measure_us(codec.loads, body):>8.2f} '
+                  f'{measure_us(codec.dumps_bytes, payload):>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import random
+import time
+
+from typing import List
+
+from _testing.benchmarks.fake_connections import make_open_connections, bytes_written
+
+from aio_rmq_wss_proxy import DeflateCompression, SecuredWebsocketServerProtocol
+
+RECEIVERS_AMOUNT = 1000
+ROUNDS = 5
+LEVELS_AMOUNTS = (5, 50, 500, 5000)
+
+MODES = {
+    'off': None,
+    'per client': DeflateCompression(),
+    'shared': DeflateCompression(shared=True),
+}
+
+
+def make_message(levels_amount: int, seed: int) -> str:
+    # order book like update, compresses about the way real market data does
+    rnd = random.Random(seed)
+
+    return json.dumps({
+        'event': 'data update',
+        'room': 'public room 1',
+        'result': {
+            'bids': [[round(27000 - num * 0.5, 2), round(rnd.uniform(0.01, 10), 4)] for num in range(levels_amount)],
+            'asks': [[round(27001 + num * 0.5, 2), round(rnd.uniform(0.01, 10), 4)] for num in range(levels_amount)]
+        }
+    })
+
+
+async def measure(compression, messages: List[str]):
+    receivers = make_open_connections(RECEIVERS_AMOUNT, compression)
+    started = time.perf_counter()
+
+    for message in messages:
+        prepared_message = SecuredWebsocketServerProtocol.prepare_message(message)
+        await asyncio.gather(*[receiver.send_prepared(prepared_message) for _, receiver in receivers])
+
+    broadcast_secs = (time.perf_counter() - started) / len(messages)
+
+    return broadcast_secs, bytes_written(receivers) / RECEIVERS_AMOUNT / len(messages)
+
+
+async def main():
+    print(f'Receivers: {RECEIVERS_AMOUNT}, rounds: {ROUNDS}')
+    print(f'{"message, B":>11} {"mode":>11} {"broadcast, ms":>14} {"per client, B":>14} {"ratio":>6}')
+
+    for levels_amount in LEVELS_AMOUNTS:
+        # every round sends another update, like a real feed does
+        messages = [make_message(levels_amount, seed) for seed in range(ROUNDS)]
+        message_bytes = sum(len(message) for message in messages) / ROUNDS
+
+        for mode, compression in MODES.items():
+            broadcast_secs, client_bytes = await measure(compression, messages)
+
+            print(f'{message_bytes:>11.0f} {mode:>11} {broadcast_secs * 1000:>14.1f} {client_bytes:>14.0f} '
+                  f'{client_bytes / message_bytes:>6.2f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import asyncio
+
+from typing import List, Optional, Tuple
+
+from websockets.connection import State
+from websockets.legacy.protocol import WebSocketCommonProtocol
+
+from aio_rmq_wss_proxy import DeflateCompression, SecuredWebsocketServerProtocol
+
+
+class SinkTransport(asyncio.Transport):
+    """
+
+    Transport which accepts everything written to it and only counts bytes, so benchmarks measure
+    the proxy's own work without network
+
+    """
+
+    def __init__(self):
+        super(SinkTransport, self).__init__()
+        self.bytes_written = 0
+        self._closing = False
+
+    def write(self, data):
+        self.bytes_written += len(data)
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        pass
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        self._closing = True
+
+    def abort(self):
+        self._closing = True
+
+
+class _FakeWsServer:
+
+    def register(self, protocol):
+        pass
+
+    def unregister(self, protocol):
+        pass
+
+
+def make_open_connections(amount: int,
+                          compression: Optional[DeflateCompression] = None) -> List[Tuple[str,
+                                                                                    SecuredWebsocketServerProtocol]]:
+    """
+    Creates opened server side websocket connections attached to sink transports.
+    Must be called with a running event loop
+    :param compression: permessage-deflate negotiated the way AsyncServer with this compression does it
+    """
+    loop = asyncio.get_running_loop()
+    ws_server = _FakeWsServer()
+    connections = []
+
+    for num in range(amount):
+        websocket = SecuredWebsocketServerProtocol(ws_handler=None, ws_server=ws_server)
+        # skips server's connection_made which would start the handshake handler
+        WebSocketCommonProtocol.connection_made(websocket, SinkTransport())
+        websocket.state = State.OPEN
+        # stands for the reading task started by a real handshake, never finishes here
+        websocket.transfer_data_task = loop.create_future()
+
+        if compression is not None and compression.enabled:
+            extension_factory = compression.get_serve_kwargs()['extensions'][0]
+            _, extension = extension_factory.process_request_params([], [])
+            websocket.extensions = [extension]
+
+            if compression.can_share(extension):
+                websocket._shared_compression = compression
+
+        connections.append((str(num), websocket))
+
+    return connections
+
+
+def bytes_written(connections: List[Tuple[str, SecuredWebsocketServerProtocol]]) -> int:
+    return sum(websocket.transport.bytes_written for _, websocket in connections)
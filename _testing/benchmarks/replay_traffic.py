@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import cProfile
+import logging
+import time
+
+from typing import List
+
+from _testing.benchmarks.fake_connections import make_open_connections
+
+from aio_rmq_wss_proxy import ClientsController, ClientsSender, ReceivedMessagesQueue, ReplayTransport
+
+
+class ReplayClientsSender(ClientsSender):
+
+    async def _process_received_message(self, message_json):
+        room = message_json.get('room')
+
+        if room is not None:
+            await self._send_room_update(room, message_json)
+
+
+def read_rooms(path: str) -> List[str]:
+    rooms = set()
+
+    with open(path, 'rb') as file:
+        while True:
+            records = ReplayTransport.read_records(file, ReplayTransport.READ_CHUNK_RECORDS)
+
+            if not records:
+                break
+
+            rooms.update(room for _, room, _ in records if room is not None)
+
+    return sorted(rooms)
+
+
+async def replay(args):
+    logger = logging.getLogger('replay')
+    exception_queue = asyncio.Queue()
+    received_messages_queue = ReceivedMessagesQueue(10000, logger)
+
+    rooms = read_rooms(args.file)
+    clients_controller = ClientsController({room: [] for room in rooms}, logger, exception_queue)
+    connections = make_open_connections(args.receivers)
+
+    for num, (client_id, websocket) in enumerate(connections):
+        clients_controller.add_new_client(client_id, websocket)
+
+        if rooms:
+            clients_controller.subscribe_room(client_id, rooms[num % len(rooms)])
+
+    clients_sender = ReplayClientsSender('Replay Sender', received_messages_queue, clients_controller,
+                                         logger, exception_queue, shards_amount=args.shards)
+
+    # decoded messages get their recorded room (routing key)
+    transport = ReplayTransport(args.file, received_messages_queue, logger, exception_queue,
+                                rate=args.rate,
+                                loops=args.loops,
+                                speed=args.speed,
+                                passthrough=args.passthrough,
+                                room_field='room')
+
+    loop = asyncio.get_running_loop()
+    sender_task = loop.create_task(clients_sender.queue_handler())
+    consume_task = loop.create_task(transport.consume())
+
+    cpu_started = time.process_time()
+
+    finished_task = loop.create_task(transport.finished.wait())
+    await asyncio.wait([finished_task, consume_task], return_when=asyncio.FIRST_COMPLETED)
+
+    cpu_secs = time.process_time() - cpu_started
+
+    consume_task.cancel()
+    sender_task.cancel()
+    finished_task.cancel()
+    await asyncio.gather(consume_task, sender_task, finished_task, return_exceptions=True)
+
+    while not exception_queue.empty():
+        name, title, ex = exception_queue.get_nowait()
+        print(f'{name} {title}: {ex}')
+
+    sent_bytes = sum(websocket.transport.bytes_written for _, websocket in connections)
+
+    print(f'Rooms: {len(rooms)}, receivers: {args.receivers}, speed: {args.speed or "max"}')
+    print(f'Messages: {transport.replayed_amount}, secs: {transport.replay_secs:.2f}, '
+          f'messages/s: {transport.replayed_amount / max(transport.replay_secs, 1e-9):.0f}, '
+          f'CPU secs: {cpu_secs:.2f}, sent MB: {sent_bytes / 1024 / 1024:.1f}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Replays traffic recorded by TrafficRecorder through the fan-out '
+                                                 'path to fake websocket clients')
+    parser.add_argument('file', help='replay file')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='1 is the recorded timing, 2 is twice as fast, 0 is as fast as possible')
+    parser.add_argument('--rate', type=float, default=0, help='messages per second if speed is 0, 0 is max')
+    parser.add_argument('--loops', type=int, default=1)
+    parser.add_argument('--receivers', type=int, default=1000)
+    parser.add_argument('--shards', type=int, default=1, help='clients sender shards')
+    parser.add_argument('--passthrough', action='store_true', help='sends bodies without decoding')
+    parser.add_argument('--profile', help='saves cProfile stats to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(asyncio.run, replay(args))
+        profiler.dump_stats(args.profile)
+    else:
+        asyncio.run(replay(args))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    main()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import random
+import re
+import time
+
+from aio_rmq_wss_proxy import ClientsController, RoomsTrie
+
+CLIENTS_AMOUNT = 100000
+ROOMS_AMOUNT = 1000
+ROOMS_PER_CLIENT = 10
+SAMPLE_OPS = 1000
+PATTERNS_AMOUNTS = (100, 1000, 10000)
+
+
+class ListRoomsController:
+    """
+
+    Rooms as lists, the way ClientsController kept them before indexing
+
+    """
+
+    def __init__(self, rooms):
+        self._rooms = rooms
+        self._clients = {}
+
+    def subscribe_room(self, client_id, room_name):
+        if client_id not in self._rooms[room_name]:
+            self._rooms[room_name].append(client_id)
+
+    def unsubscribe_room(self, client_id, room_name):
+        if client_id in self._rooms[room_name]:
+            self._rooms[room_name].remove(client_id)
+
+    def remove_client(self, client_id):
+        if client_id in self._clients:
+            self._clients.pop(client_id)
+
+        for room_key in self._rooms:
+            room = self._rooms[room_key]
+            if client_id in room:
+                room.remove(client_id)
+
+
+class _StubWebsocket:
+
+    def add_close_callback(self, callback):
+        pass
+
+
+def pattern_to_regex(pattern: str):
+    return re.compile('^' + r'\.'.join('[^.]+' if word == '*' else '.*' if word == '#' else re.escape(word)
+                                        for word in pattern.split('.')) + '$')
+
+
+def compare_patterns_lookup():
+    rnd = random.Random(3)
+
+    print(f'{"patterns":>12} {"scan, us":>12} {"trie, us":>12} {"speedup":>10}')
+
+    for patterns_amount in PATTERNS_AMOUNTS:
+        patterns = [f'trades.SYM{num}.*' if num % 2 else f'trades.SYM{num}.#' for num in range(patterns_amount)]
+        regexes = [pattern_to_regex(pattern) for pattern in patterns]
+
+        trie = RoomsTrie()
+
+        for client_num, pattern in enumerate(patterns):
+            trie.add(pattern, str(client_num), None)
+
+        rooms = [(f'trades.SYM{rnd.randrange(patterns_amount)}.{rnd.randrange(100)}',) for _ in range(SAMPLE_OPS)]
+
+        scan_us = measure_us(lambda room: [regex for regex in regexes if regex.match(room)], rooms)
+        trie_us = measure_us(trie.match, rooms)
+
+        print(f'{patterns_amount:>12} {scan_us:>12.2f} {trie_us:>12.2f} {scan_us / trie_us:>9.0f}x')
+
+
+def make_subscriptions():
+    rnd = random.Random(42)
+    rooms_names = [f'room {num}' for num in range(ROOMS_AMOUNT)]
+
+    return rooms_names, {str(num): rnd.sample(rooms_names, ROOMS_PER_CLIENT) for num in range(CLIENTS_AMOUNT)}
+
+
+def measure_us(method, args) -> float:
+    started = time.perf_counter()
+
+    for arg in args:
+        method(*arg)
+
+    return (time.perf_counter() - started) / len(args) * 1000000
+
+
+def run(controller, subscriptions, rooms_names):
+    rnd = random.Random(7)
+    clients_ids = rnd.sample(list(subscriptions), SAMPLE_OPS)
+
+    return {
+        'subscribe': measure_us(controller.subscribe_room,
+                                [(client_id, rnd.choice(rooms_names)) for client_id in clients_ids]),
+        'unsubscribe': measure_us(controller.unsubscribe_room,
+                                  [(client_id, subscriptions[client_id][0]) for client_id in clients_ids]),
+        'disconnect': measure_us(controller.remove_client, [(client_id,) for client_id in clients_ids]),
+    }
+
+
+async def main():
+    rooms_names, subscriptions = make_subscriptions()
+
+    rooms_lists = {room_name: [] for room_name in rooms_names}
+
+    for client_id, client_rooms in subscriptions.items():
+        for room_name in client_rooms:
+            rooms_lists[room_name].append(client_id)
+
+    list_controller = ListRoomsController(rooms_lists)
+
+    indexed_controller = ClientsController({room_name: [] for room_name in rooms_names},
+                                           logging.getLogger('benchmark'), asyncio.Queue())
+
+    for client_id, client_rooms in subscriptions.items():
+        indexed_controller.add_new_client(client_id, _StubWebsocket())
+
+        for room_name in client_rooms:
+            indexed_controller.subscribe_room(client_id, room_name)
+
+    print(f'{CLIENTS_AMOUNT} clients x {ROOMS_AMOUNT} rooms, {ROOMS_PER_CLIENT} rooms per client, '
+          f'{SAMPLE_OPS} sampled operations')
+    print(f'{"operation":>12} {"lists, us":>12} {"indexed, us":>12} {"speedup":>10}')
+
+    list_results = run(list_controller, subscriptions, rooms_names)
+    indexed_results = run(indexed_controller, subscriptions, rooms_names)
+
+    for operation in list_results:
+        print(f'{operation:>12} {list_results[operation]:>12.2f} {indexed_results[operation]:>12.2f} '
+              f'{list_results[operation] / indexed_results[operation]:>9.0f}x')
+
+    print(f'\nWildcard subscriptions lookup, {SAMPLE_OPS} sampled rooms')
+    compare_patterns_lookup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from _testing.benchmarks.fake_connections import make_open_connections
+
+from aio_rmq_wss_proxy import ClientsController, ClientsSender, InMemoryTransport, ReceivedMessagesQueue, \
+    ReplayTransport, UnixSocketTransport
+
+RECEIVERS_AMOUNT = 100
+ROOMS_AMOUNT = 10
+MESSAGES_AMOUNT = 20000
+
+
+class BenchmarkClientsSender(ClientsSender):
+
+    def __init__(self, *args, **kwargs):
+        super(BenchmarkClientsSender, self).__init__(*args, **kwargs)
+        self.all_sent = asyncio.Event()
+        self._sent_amount = 0
+
+    async def _process_received_message(self, message_json):
+        await self._send_room_update(message_json['room'], message_json)
+
+        self._sent_amount += 1
+
+        if self._sent_amount == MESSAGES_AMOUNT:
+            self.all_sent.set()
+
+
+def make_bodies():
+    return [(f'room {num % ROOMS_AMOUNT}',
+             json.dumps({'seq': num, 'price': 27000.5 + num, 'volume': 1.25}).encode('utf-8'))
+            for num in range(MESSAGES_AMOUNT)]
+
+
+async def drive_in_memory(transport: InMemoryTransport, bodies):
+    for room, body in bodies:
+        await transport.publish_body(body, room)
+
+
+async def drive_unix_socket(path: str, bodies):
+    _, writer = await asyncio.open_unix_connection(path)
+
+    for room, body in bodies:
+        writer.write(UnixSocketTransport.pack(body, room))
+        await writer.drain()
+
+    writer.close()
+
+
+async def measure(transport_name: str, bodies, replay_path: str, socket_path: str) -> float:
+    logger = logging.getLogger('benchmark')
+    exception_queue = asyncio.Queue()
+    received_messages_queue = ReceivedMessagesQueue(1000, logger)
+
+    rooms = {f'room {num}': [] for num in range(ROOMS_AMOUNT)}
+    clients_controller = ClientsController(rooms, logger, exception_queue)
+
+    for client_id, websocket in make_open_connections(RECEIVERS_AMOUNT):
+        clients_controller.add_new_client(client_id, websocket)
+        clients_controller.subscribe_room(client_id, f'room {int(client_id) % ROOMS_AMOUNT}')
+
+    clients_sender = BenchmarkClientsSender('Benchmark Sender', received_messages_queue, clients_controller,
+                                            logger, exception_queue)
+    sender_task = asyncio.get_running_loop().create_task(clients_sender.queue_handler())
+
+    # decoded messages get their room from the transport
+    room_field = 'room'
+
+    if transport_name == 'replay':
+        transport = ReplayTransport(replay_path, received_messages_queue, logger, exception_queue,
+                                    room_field=room_field)
+    elif transport_name == 'unix socket':
+        transport = UnixSocketTransport(socket_path, received_messages_queue, logger, exception_queue,
+                                        room_field=room_field)
+    else:
+        transport = InMemoryTransport(received_messages_queue, logger, exception_queue, room_field=room_field)
+
+    consume_task = asyncio.get_running_loop().create_task(transport.consume())
+    await asyncio.sleep(0.1)
+
+    started = time.perf_counter()
+
+    if transport_name == 'unix socket':
+        await drive_unix_socket(socket_path, bodies)
+    elif transport_name == 'in memory':
+        await drive_in_memory(transport, bodies)
+
+    await clients_sender.all_sent.wait()
+
+    elapsed_secs = time.perf_counter() - started
+
+    consume_task.cancel()
+    sender_task.cancel()
+    await asyncio.gather(consume_task, sender_task)
+
+    assert exception_queue.empty(), exception_queue.get_nowait()
+
+    return elapsed_secs
+
+
+async def main():
+    bodies = make_bodies()
+
+    with tempfile.TemporaryDirectory() as directory:
+        replay_path = os.path.join(directory, 'replay.bin')
+        socket_path = os.path.join(directory, 'transport.sock')
+
+        with open(replay_path, 'wb') as replay_file:
+            for room, body in bodies:
+                replay_file.write(ReplayTransport.pack(body, room))
+
+        print(f'Messages: {MESSAGES_AMOUNT}, receivers: {RECEIVERS_AMOUNT}, rooms: {ROOMS_AMOUNT}')
+        print(f'{"transport":>12} {"secs":>7} {"messages/s":>11}')
+
+        for transport_name in ('in memory', 'unix socket', 'replay'):
+            elapsed_secs = await measure(transport_name, bodies, replay_path, socket_path)
+            print(f'{transport_name:>12} {elapsed_secs:>7.2f} {MESSAGES_AMOUNT / elapsed_secs:>11.0f}')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main())
@@ -0,0 +1,9 @@
+from typing import Dict
+
+from aio_rmq_wss_proxy import ClientsSender
+
+
+class LoadTestClientsSender(ClientsSender):
+
+    async def _process_received_message(self, message_json: Dict):
+        await self._send_room_update(message_json['room'], message_json)
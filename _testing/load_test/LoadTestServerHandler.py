@@ -0,0 +1,16 @@
+from typing import Dict
+
+from aio_rmq_wss_proxy import AsyncServerHandler, SecuredWebsocketServerProtocol
+
+
+class LoadTestServerHandler(AsyncServerHandler):
+
+    async def _process_data(self, client_id: str, websocket: SecuredWebsocketServerProtocol, json_obj: Dict):
+        room_name = json_obj.get('room')
+
+        if json_obj.get('event') != 'subscribe' or not self._clients_controller.check_room_allowed(room_name):
+            await websocket.send(self._codec.dumps({'event': json_obj.get('event'), 'result': 'error'}))
+            return
+
+        self._clients_controller.subscribe_room(client_id, room_name)
+        await websocket.send(self._codec.dumps({'event': 'subscribe', 'room': room_name, 'result': 'OK'}))
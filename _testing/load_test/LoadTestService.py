@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+import resource
+import time
+
+from logging import Logger
+
+from _testing.load_test.LoadTestClientsSender import LoadTestClientsSender
+from _testing.load_test.LoadTestServerHandler import LoadTestServerHandler
+from _testing.load_test.LocalRmqStandIn import LocalRmqStandIn
+
+from aio_rmq_wss_proxy import AsyncServer, ClientsController, MainServerLoop, Metrics, ReceivedMessagesQueue, \
+    SecuredWebsocketServerProtocol
+
+
+class LoadTestService(MainServerLoop):
+    """
+
+    Full proxy (websocket server, clients controller and sender) fed by LocalRmqStandIn instead of RabbitMQ.
+    Server side results (published messages, CPU, RSS, fan-out latency) are put to results_queue when publishing ends
+
+    """
+
+    def __init__(self, ws_host: str, ws_port: int,
+                 logger: Logger,
+                 start_event: multiprocessing.Event,
+                 results_queue: multiprocessing.Queue,
+                 rooms_amount: int,
+                 rate: float,
+                 duration_secs: float,
+                 payload_size: int,
+                 shards_amount: int = 1,
+                 use_uvloop: bool = False):
+        exception_queue = asyncio.Queue()
+
+        self._metrics = Metrics()
+        self._results_queue = results_queue
+        self._started_at = time.monotonic()
+        self._started_cpu_secs = 0
+
+        clients_controller = ClientsController({f'room {room_num}': [] for room_num in range(rooms_amount)},
+                                               logger, exception_queue, self._metrics)
+
+        async_server_handler = LoadTestServerHandler(clients_controller, logger, exception_queue,
+                                                     metrics=self._metrics)
+
+        async_server = AsyncServer(async_server_handler.do_action, SecuredWebsocketServerProtocol,
+                                   ws_host, ws_port, logger)
+
+        # stand-in waits like RMQ consumer when sender is behind
+        received_messages_queue = ReceivedMessagesQueue(10000, logger, metrics=self._metrics)
+
+        stand_in = LocalRmqStandIn(received_messages_queue, logger, exception_queue, start_event,
+                                   rooms_amount, rate, duration_secs, payload_size, self._on_started, self._report)
+
+        clients_sender = LoadTestClientsSender('Load Test Sender', received_messages_queue, clients_controller,
+                                               logger, exception_queue, shards_amount=shards_amount,
+                                               metrics=self._metrics)
+
+        super(LoadTestService, self).__init__('Load Test Service',
+                                              async_server,
+                                              async_server_handler,
+                                              stand_in,
+                                              clients_controller,
+                                              clients_sender,
+                                              logger,
+                                              exception_queue,
+                                              self._metrics,
+                                              use_uvloop=use_uvloop)
+
+    @staticmethod
+    def _get_cpu_secs() -> float:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    def _on_started(self):
+        # connecting clients is not counted
+        self._started_at = time.monotonic()
+        self._started_cpu_secs = self._get_cpu_secs()
+
+    def _report(self, published_amount: int):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+
+        self._results_queue.put({
+            'published': published_amount,
+            'server_secs': time.monotonic() - self._started_at,
+            'server_cpu_secs': usage.ru_utime + usage.ru_stime - self._started_cpu_secs,
+            # kilobytes on Linux
+            'server_max_rss_mb': usage.ru_maxrss / 1024,
+            'messages_sent': self._metrics.get_counter(Metrics.MESSAGES_SENT),
+            'send_errors': self._metrics.get_counter(Metrics.SEND_ERRORS),
+        })
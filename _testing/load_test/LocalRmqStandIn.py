@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import time
+
+from logging import Logger
+
+from aio_rmq_wss_proxy import InMemoryTransport
+
+
+class LocalRmqStandIn(InMemoryTransport):
+    """
+
+    Stands for AioRmqConsumer without broker: publishes generated messages through in-memory transport
+    at the given rate once start_event is set
+
+    """
+
+    def __init__(self, received_messages_queue: asyncio.Queue,
+                 logger: Logger,
+                 exception_queue: asyncio.Queue,
+                 start_event: multiprocessing.Event,
+                 rooms_amount: int,
+                 rate: float,
+                 duration_secs: float,
+                 payload_size: int,
+                 on_started,
+                 on_finished):
+        super(LocalRmqStandIn, self).__init__(received_messages_queue, logger, exception_queue,
+                                              name='Local RMQ Stand-in')
+
+        self._start_event = start_event
+        self._rooms_amount = rooms_amount
+        self._rate = rate
+        self._duration_secs = duration_secs
+        self._payload = 'x' * payload_size
+        self._on_started = on_started
+        self._on_finished = on_finished
+
+        self.published_amount = 0
+
+    def _make_message(self, seq: int):
+        return {
+            'room': f'room {seq % self._rooms_amount}',
+            'seq': seq,
+            'sent_at': time.time(),
+            'payload': self._payload
+        }
+
+    async def _publish(self):
+        started = time.monotonic()
+        total_amount = int(self._duration_secs * self._rate)
+
+        while self.published_amount < total_amount:
+            due_amount = min(int((time.monotonic() - started) * self._rate) + 1, total_amount)
+
+            while self.published_amount < due_amount:
+                await self.publish(self._make_message(self.published_amount))
+                self.published_amount += 1
+
+            await asyncio.sleep(0.005)
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+
+        try:
+            while not await loop.run_in_executor(None, self._start_event.wait, 0.5):
+                pass
+
+            self._logger.warning(f'{self.name} Publishing [Rate: {self._rate}/s][Duration: {self._duration_secs}s]')
+            self._on_started()
+
+            await self._publish()
+            await self._received_messages_queue.join()
+
+            self._logger.warning(f'{self.name} Published {self.published_amount} messages')
+            self._on_finished(self.published_amount)
+
+        except asyncio.CancelledError:
+            self._logger.warning(f'{self.name} Stopped')
+
+        except Exception as ex:
+            await self._exception_queue.put((self.name, 'Publishing', ex))
@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import time
+
+from collections import Counter
+
+import websockets
+
+from aio_rmq_wss_proxy import JsonCodec
+
+# latencies are counted in buckets of LATENCY_RESOLUTION_SECS, so results of processes can be merged
+LATENCY_RESOLUTION_SECS = 0.0001
+
+
+def get_percentile(histogram: Counter, percentile: float) -> float:
+    total = sum(histogram.values())
+
+    if not total:
+        return 0
+
+    rank = total * percentile / 100
+    passed = 0
+
+    for bucket in sorted(histogram):
+        passed += histogram[bucket]
+
+        if passed >= rank:
+            return bucket * LATENCY_RESOLUTION_SECS
+
+    return max(histogram) * LATENCY_RESOLUTION_SECS
+
+
+class LoadClients:
+    """
+
+    Websocket clients of one process: every client subscribes to one room and counts received messages
+    and their latency (time since the message was published by LocalRmqStandIn)
+
+    """
+
+    def __init__(self, url: str, client_nums: range, rooms_amount: int,
+                 ready_counter: multiprocessing.Value,
+                 stop_event: multiprocessing.Event,
+                 connect_concurrency: int = 100):
+        self._url = url
+        self._client_nums = client_nums
+        self._rooms_amount = rooms_amount
+        self._ready_counter = ready_counter
+        self._stop_event = stop_event
+        self._connect_semaphore = asyncio.Semaphore(connect_concurrency)
+
+        self._codec = JsonCodec()
+
+        self.received_amount = 0
+        self.errors_amount = 0
+        self.latency_histogram = Counter()
+
+    async def _connect(self, client_num: int) -> websockets.WebSocketClientProtocol:
+        async with self._connect_semaphore:
+            ws = await websockets.connect(self._url, max_queue=None, ping_interval=None)
+
+            await ws.send(self._codec.dumps({'event': 'subscribe', 'room': f'room {client_num % self._rooms_amount}'}))
+            response = self._codec.loads(await ws.recv())
+
+            if response.get('result') != 'OK':
+                raise RuntimeError(f'Subscribe Error: {response}')
+
+        with self._ready_counter.get_lock():
+            self._ready_counter.value += 1
+
+        return ws
+
+    async def _receive(self, ws: websockets.WebSocketClientProtocol):
+        async for message in ws:
+            received_at = time.time()
+            message_json = self._codec.loads(message)
+
+            self.received_amount += 1
+            self.latency_histogram[int((received_at - message_json['sent_at']) / LATENCY_RESOLUTION_SECS)] += 1
+
+    async def _client(self, client_num: int):
+        try:
+            ws = await self._connect(client_num)
+        except Exception:
+            self.errors_amount += 1
+            return
+
+        try:
+            await self._receive(ws)
+        except asyncio.CancelledError:
+            await ws.close()
+        except Exception:
+            self.errors_amount += 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        clients = [loop.create_task(self._client(client_num)) for client_num in self._client_nums]
+
+        while not await loop.run_in_executor(None, self._stop_event.wait, 0.5):
+            pass
+
+        for client in clients:
+            client.cancel()
+
+        await asyncio.gather(*clients, return_exceptions=True)
+
+
+def run_clients(url: str, client_nums: range, rooms_amount: int,
+                ready_counter: multiprocessing.Value,
+                stop_event: multiprocessing.Event,
+                results_queue: multiprocessing.Queue):
+    clients = LoadClients(url, client_nums, rooms_amount, ready_counter, stop_event)
+
+    asyncio.run(clients.run())
+
+    results_queue.put({
+        'received': clients.received_amount,
+        'errors': clients.errors_amount,
+        'latency_histogram': dict(clients.latency_histogram)
+    })
@@ -0,0 +1,210 @@
+import argparse
+import json
+import multiprocessing
+import socket
+import sys
+import tempfile
+import time
+
+from collections import Counter
+
+from logger.LoggerLoader import LoggerLoader
+from _testing.load_test.LoadTestService import LoadTestService
+from _testing.load_test.load_clients import get_percentile, run_clients
+
+# metric name -> True if higher value is better
+COMPARED_METRICS = {
+    'delivered_per_sec': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'server_cpu_percent': False,
+    'server_max_rss_mb': False,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Proxy load test without RabbitMQ and network')
+    parser.add_argument('--clients', type=int, default=1000, help='websocket clients amount')
+    parser.add_argument('--processes', type=int, default=4, help='processes the clients are spread across')
+    parser.add_argument('--rooms', type=int, default=10, help='rooms amount, clients are spread evenly')
+    parser.add_argument('--rate', type=float, default=100, help='published messages per second')
+    parser.add_argument('--duration', type=float, default=10, help='publishing duration, seconds')
+    parser.add_argument('--payload-size', type=int, default=200, help='message payload size, bytes')
+    parser.add_argument('--shards', type=int, default=1, help='clients sender shards amount')
+    parser.add_argument('--uvloop', action='store_true', help='server runs in uvloop\'s loop')
+    parser.add_argument('--port', type=int, default=9101)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--save', help='save results to the JSON file')
+    parser.add_argument('--compare', help='compare results with the ones saved to the JSON file')
+    parser.add_argument('--tolerance', type=float, default=10, help='allowed regression, percents')
+    return parser.parse_args()
+
+
+def run_server(args, start_event: multiprocessing.Event, results_queue: multiprocessing.Queue):
+    logger = LoggerLoader('load_test.log', args.log_level, tempfile.gettempdir() + '/').get_logger()
+
+    service = LoadTestService('localhost', args.port, logger, start_event, results_queue,
+                              args.rooms, args.rate, args.duration, args.payload_size, args.shards, args.uvloop)
+
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        service.cancel()
+
+
+def wait_port(port: int, timeout_secs: float):
+    deadline = time.monotonic() + timeout_secs
+
+    while True:
+        try:
+            socket.create_connection(('localhost', port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+
+            time.sleep(0.1)
+
+
+def wait_ready(ready_counter: multiprocessing.Value, clients_amount: int, timeout_secs: float):
+    deadline = time.monotonic() + timeout_secs
+
+    while ready_counter.value < clients_amount:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'Only {ready_counter.value} of {clients_amount} clients subscribed')
+
+        time.sleep(0.1)
+
+
+def get_expected_deliveries(args, published: int) -> int:
+    # clients and messages are both spread across rooms by modulo
+    expected = 0
+
+    for room_num in range(args.rooms):
+        room_subscribers = len(range(room_num, args.clients, args.rooms))
+        room_messages = len(range(room_num, published, args.rooms))
+        expected += room_subscribers * room_messages
+
+    return expected
+
+
+def make_report(args, server_results: dict, clients_results: list) -> dict:
+    histogram = Counter()
+
+    for client_results in clients_results:
+        histogram.update({int(bucket): amount for bucket, amount in client_results['latency_histogram'].items()})
+
+    delivered = sum(client_results['received'] for client_results in clients_results)
+    published = server_results['published']
+    server_secs = server_results['server_secs']
+
+    return {
+        'clients': args.clients,
+        'rooms': args.rooms,
+        'rate': args.rate,
+        'duration': args.duration,
+        'payload_size': args.payload_size,
+        'shards': args.shards,
+        'uvloop': args.uvloop,
+        'published': published,
+        'published_per_sec': published / server_secs,
+        'delivered': delivered,
+        'expected': get_expected_deliveries(args, published),
+        'delivered_per_sec': delivered / server_secs,
+        'client_errors': sum(client_results['errors'] for client_results in clients_results),
+        'send_errors': server_results['send_errors'],
+        'latency_p50_ms': get_percentile(histogram, 50) * 1000,
+        'latency_p90_ms': get_percentile(histogram, 90) * 1000,
+        'latency_p99_ms': get_percentile(histogram, 99) * 1000,
+        'latency_p999_ms': get_percentile(histogram, 99.9) * 1000,
+        'latency_max_ms': get_percentile(histogram, 100) * 1000,
+        'server_cpu_percent': server_results['server_cpu_secs'] / server_secs * 100,
+        'server_max_rss_mb': server_results['server_max_rss_mb'],
+    }
+
+
+def print_report(report: dict):
+    for key, value in report.items():
+        print(f'{key:>20}: {value:.2f}' if isinstance(value, float) else f'{key:>20}: {value}')
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    passed = True
+
+    print(f'{"metric":>20} {"baseline":>10} {"current":>10} {"change, %":>10}')
+
+    for key, higher_is_better in COMPARED_METRICS.items():
+        was, now = baseline[key], report[key]
+        change = (now - was) / was * 100 if was else 0
+        regressed = -change > tolerance if higher_is_better else change > tolerance
+        passed = passed and not regressed
+
+        print(f'{key:>20} {was:>10.2f} {now:>10.2f} {change:>+10.1f}{"  REGRESSION" if regressed else ""}')
+
+    return passed
+
+
+def main():
+    args = parse_args()
+
+    start_event = multiprocessing.Event()
+    stop_event = multiprocessing.Event()
+    ready_counter = multiprocessing.Value('i', 0)
+    server_queue = multiprocessing.Queue()
+    clients_queue = multiprocessing.Queue()
+
+    server = multiprocessing.Process(target=run_server, args=(args, start_event, server_queue), daemon=True)
+    server.start()
+
+    wait_port(args.port, 10)
+
+    clients_processes = [
+        multiprocessing.Process(target=run_clients,
+                                args=(f'ws://localhost:{args.port}', range(process_num, args.clients, args.processes),
+                                      args.rooms, ready_counter, stop_event, clients_queue),
+                                daemon=True)
+        for process_num in range(args.processes)
+    ]
+
+    for process in clients_processes:
+        process.start()
+
+    try:
+        wait_ready(ready_counter, args.clients, 60)
+
+        print(f'{args.clients} clients subscribed, publishing {args.rate} messages/s for {args.duration}s')
+        start_event.set()
+
+        server_results = server_queue.get(timeout=args.duration + 60)
+
+        # lets the last sent frames reach the clients
+        time.sleep(1)
+
+    finally:
+        stop_event.set()
+
+    clients_results = [clients_queue.get(timeout=30) for _ in clients_processes]
+
+    for process in clients_processes:
+        process.join()
+
+    server.terminate()
+    server.join()
+
+    report = make_report(args, server_results, clients_results)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
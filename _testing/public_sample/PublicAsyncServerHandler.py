@@ -1,5 +1,4 @@
 import asyncio
-import json
 
 from logging import Logger
 
@@ -7,7 +6,7 @@ from typing import Dict, Optional
 
 from _testing.public_sample.const import MessageKeys, Events
 
-from aio_rmq_wss_proxy import AsyncServerHandler, ClientsController, SecuredWebsocketServerProtocol
+from aio_rmq_wss_proxy import AsyncServerHandler, ClientsController, Metrics, SecuredWebsocketServerProtocol
 
 
 class PublicAsyncServerHandler(AsyncServerHandler):
@@ -18,23 +17,26 @@ class PublicAsyncServerHandler(AsyncServerHandler):
     """
 
     def __init__(self, public_client_controller: ClientsController,
-                 logger: Logger, exception_queue: asyncio.Queue):
-        super(PublicAsyncServerHandler, self).__init__(public_client_controller, logger, exception_queue)
+                 logger: Logger, exception_queue: asyncio.Queue,
+                 metrics: Optional[Metrics] = None):
+        super(PublicAsyncServerHandler, self).__init__(public_client_controller, logger, exception_queue,
+                                                       metrics=metrics)
 
     async def _process_data(self, client_id: str, websocket: SecuredWebsocketServerProtocol, json_obj: Dict):
         event = json_obj.get(MessageKeys.EVENT)
         room_name = json_obj.get(MessageKeys.ROOM)
 
         if event == Events.SUBSCRIBE:
-            if not self._clients_controller.check_room_exist(room_name):
+            if not self._clients_controller.check_room_allowed(room_name):
                 await self._send_unknown_room_message(websocket, room_name, event)
 
             else:
-                self._clients_controller.subscribe_room(client_id, room_name)
-                await self._send_subscribed_message(websocket, room_name)
+                await self._subscribe_with_snapshot(client_id, websocket, room_name,
+                                                    self._make_response(Events.SUBSCRIBE, room_name, 'OK'))
+                self._logger.debug('%s S > Subscribed [Room: %s]', self.name, room_name)
 
         elif event == Events.UNSUBSCRIBE:
-            if not self._clients_controller.check_room_exist(room_name):
+            if not self._clients_controller.check_room_allowed(room_name):
                 await self._send_unknown_room_message(websocket, room_name, event)
 
             else:
@@ -47,22 +49,23 @@ class PublicAsyncServerHandler(AsyncServerHandler):
     async def _send_unknown_room_message(self, websocket: SecuredWebsocketServerProtocol, room_name: str, event: str):
         await self._send_response(websocket, event, room_name, f'unknown room: {room_name}')
 
-    async def _send_subscribed_message(self, websocket: SecuredWebsocketServerProtocol, room_name: str):
-        await self._send_response(websocket, Events.SUBSCRIBE, room_name, 'OK')
-
     async def _send_unsubscribed_message(self, websocket: SecuredWebsocketServerProtocol, room_name: str):
         await self._send_response(websocket, Events.UNSUBSCRIBE, room_name, 'OK')
 
     async def _send_unknown_event_message(self, websocket: SecuredWebsocketServerProtocol, event: str):
         await self._send_response(websocket, event, None, f'unknown event: {event}')
 
-    async def _send_response(self, websocket: SecuredWebsocketServerProtocol,
-                             event: str, room: Optional[str], result: str):
-        message = json.dumps({
+    def _make_response(self, event: str, room: Optional[str], result: str) -> Dict:
+        return {
             MessageKeys.EVENT: event,
             MessageKeys.ROOM: room,
             MessageKeys.RESULT: result
-        })
+        }
+
+    async def _send_response(self, websocket: SecuredWebsocketServerProtocol,
+                             event: str, room: Optional[str], result: str):
+        message = self._make_response(event, room, result)
 
-        await websocket.send(message)
-        self._logger.debug(f'{self.name} S > {message}')
+        # encoded in client's wire format
+        await websocket.send_prepared(self._prepare_message(websocket, message))
+        self._logger.debug('%s S > %s', self.name, message)
@@ -1,11 +1,11 @@
 import asyncio
 
 from logging import Logger
-from typing import Dict, Optional
+from typing import Any, Dict, Hashable, Optional
 
 from _testing.public_sample.const import MessageKeys, Actions, Events
 
-from aio_rmq_wss_proxy import ClientsController, ClientsSender
+from aio_rmq_wss_proxy import ClientsController, ClientsSender, Metrics
 
 
 class PublicClientsSender(ClientsSender):
@@ -17,10 +17,21 @@ class PublicClientsSender(ClientsSender):
 
     def __init__(self, from_queue: asyncio.Queue,
                  clients_controller: ClientsController,
-                 logger: Logger, exception_queue: asyncio.Queue):
+                 logger: Logger, exception_queue: asyncio.Queue,
+                 metrics: Optional[Metrics] = None):
         super(PublicClientsSender, self).__init__('Pub Clients Sender',
                                                   from_queue, clients_controller,
-                                                  logger, exception_queue)
+                                                  logger, exception_queue,
+                                                  metrics=metrics)
+
+    @staticmethod
+    def _get_room(message_json: Dict) -> str:
+        return 'public room 1'
+
+    def _get_shard_key(self, message: Any) -> Optional[Hashable]:
+        # RMQ messages don't keep their room, it's the room of the prepared update
+        return self._get_room(message) if isinstance(message, dict) else \
+            super(PublicClientsSender, self)._get_shard_key(message)
 
     def _prepare_update(self, message_json: Dict) -> Optional[Dict]:
         action = message_json[MessageKeys.ACTION]
@@ -31,7 +42,7 @@ class PublicClientsSender(ClientsSender):
 
         return {
             MessageKeys.EVENT: Events.DATA_UPDATE,
-            MessageKeys.ROOM: 'public room 1',
+            MessageKeys.ROOM: self._get_room(message_json),
             MessageKeys.RESULT: message_json[MessageKeys.DATA]
         }
 
@@ -41,11 +52,4 @@ class PublicClientsSender(ClientsSender):
         if not message_to_send:
             return
 
-        room = message_to_send[MessageKeys.ROOM]
-
-        if not self._clients_controller.check_room_exist(message_to_send[room]):
-            self._logger.warning(f'{self.name} RMQ unknown room {room}')
-            return
-
-        receivers = self._clients_controller.get_receivers(room)
-        await self._send_update(receivers, message_to_send)
+        await self._send_room_update(message_to_send[MessageKeys.ROOM], message_to_send)
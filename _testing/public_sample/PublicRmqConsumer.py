@@ -1,9 +1,9 @@
 import asyncio
 
 from logging import Logger
-from typing import Dict
+from typing import Dict, Optional
 
-from aio_rmq_wss_proxy import AioRmqConsumer
+from aio_rmq_wss_proxy import AioRmqConsumer, Metrics
 
 
 class PublicRmqConsumer(AioRmqConsumer):
@@ -17,9 +17,19 @@ class PublicRmqConsumer(AioRmqConsumer):
                  rmq_port: int,
                  received_messages_queue: asyncio.Queue,
                  logger: Logger,
-                 exception_queue: asyncio.Queue):
-        super(PublicRmqConsumer, self).__init__(rmq_host, rmq_port, 'WS_EXCHANGE', 'PUBLIC_WEBSOCKET_QUEUE',
-                                                received_messages_queue, logger, exception_queue)
+                 exception_queue: asyncio.Queue,
+                 worker_num: Optional[int] = None,
+                 metrics: Optional[Metrics] = None):
+        # every worker needs its own queue bound to the exchange to receive all the messages
+        queue_name = 'PUBLIC_WEBSOCKET_QUEUE' if worker_num is None else f'PUBLIC_WEBSOCKET_QUEUE_{worker_num}'
+
+        super(PublicRmqConsumer, self).__init__(rmq_host, rmq_port, 'WS_EXCHANGE', queue_name,
+                                                received_messages_queue, logger, exception_queue,
+                                                queue_auto_delete=worker_num is not None,
+                                                prefetch_count=1000,
+                                                # messages are acked when they're sent to clients
+                                                ack_after_fanout=True,
+                                                metrics=metrics)
 
     def _check_message(self, message_json: Dict) -> str:
         # todo some logic to check message
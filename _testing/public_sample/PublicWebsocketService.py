@@ -1,12 +1,16 @@
 import asyncio
+import os
 
 from logging import Logger
+from typing import Optional
 
 from _testing.public_sample.PublicAsyncServerHandler import PublicAsyncServerHandler
 from _testing.public_sample.PublicRmqConsumer import PublicRmqConsumer
 from _testing.public_sample.PublicClientsSender import PublicClientsSender
 
-from aio_rmq_wss_proxy import AsyncServer, ClientsController, MainServerLoop, SecuredWebsocketServerProtocol
+from aio_rmq_wss_proxy import AsyncServer, AuthCache, ClientsController, DeflateCompression, LoopProfiler, \
+    MainServerLoop, Metrics, OverflowPolicy, ReceivedMessagesQueue, RoomsSnapshots, SecuredWebsocketServerProtocol, \
+    WireCodec
 
 
 class PublicWebsocketService(MainServerLoop):
@@ -18,13 +22,18 @@ class PublicWebsocketService(MainServerLoop):
 
     def __init__(self, rmq_host: str, rmq_port: int,
                  ws_host: str, ws_port: int,
-                 logger: Logger):
+                 logger: Logger,
+                 worker_num: Optional[int] = None):
         exception_queue = asyncio.Queue()
 
+        metrics = Metrics()
+
+        # the last update of a room is sent to client right after subscribe
         clients_controller = ClientsController({f'public room {room_num}': [] for room_num in range(1, 5)},
-                                               logger, exception_queue)
+                                               logger, exception_queue, metrics,
+                                               snapshots=RoomsSnapshots(room_size=1, max_rooms=1000))
 
-        async_server_handler = PublicAsyncServerHandler(clients_controller, logger, exception_queue)
+        async_server_handler = PublicAsyncServerHandler(clients_controller, logger, exception_queue, metrics)
 
         # setup for websocket instance which is like connected client
         SecuredWebsocketServerProtocol.CHECK_IP_ADDRESS_METHOD = None
@@ -32,15 +41,43 @@ class PublicWebsocketService(MainServerLoop):
         SecuredWebsocketServerProtocol.CHECK_TOKEN_METHOD = None
         SecuredWebsocketServerProtocol.FORWARDING_IS_ON = False
 
+        # decisions of check methods are cached by token when they're set
+        SecuredWebsocketServerProtocol.AUTH_CACHE = AuthCache(ttl_secs=60, negative_ttl_secs=5, metrics=metrics)
+
+        # per client bounded outbound queue, slow client doesn't hold up the sender
+        SecuredWebsocketServerProtocol.OUTBOUND_QUEUE_SIZE = 100
+        SecuredWebsocketServerProtocol.OUTBOUND_OVERFLOW_POLICY = OverflowPolicy.DROP_OLDEST
+
+        # clients choose JSON, MessagePack or CBOR with subprotocol or "?format=" query parameter
+        SecuredWebsocketServerProtocol.WIRE_FORMATS = tuple(wire_format for wire_format in WireCodec.FORMATS
+                                                            if WireCodec.is_available(wire_format))
+
+        # Prometheus metrics on http://ws_host:ws_port/metrics for requests with "Authorization: Bearer <token>",
+        # not served unless ADMIN_TOKEN environment variable is set
+        SecuredWebsocketServerProtocol.ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+        SecuredWebsocketServerProtocol.METRICS = metrics
+
+        # callbacks blocking the loop for 100ms+ go to "profiles" directory (of the worker),
+        # "kill -USR1 <pid>" takes 10 seconds sampling profile, the HTTP endpoint (PROFILER) is off
+        profiler = LoopProfiler('profiles' if worker_num is None else f'profiles/worker-{worker_num}', logger,
+                                slow_callback_secs=0.1, metrics=metrics)
+
         async_server = AsyncServer(async_server_handler.do_action,
                                    SecuredWebsocketServerProtocol,
-                                   ws_host, ws_port, logger)
+                                   ws_host, ws_port, logger,
+                                   reuse_port=worker_num is not None,
+                                   # updates are compressed once for all the clients, small ones aren't compressed
+                                   compression=DeflateCompression(threshold=512, shared=True),
+                                   send_buffer_size=1024 * 1024)
 
-        received_messages_queue = asyncio.Queue()
+        # consumer waits while the queue is full, so RMQ holds messages when sender is behind
+        received_messages_queue = ReceivedMessagesQueue(10000, logger, metrics=metrics)
 
-        aio_rmq_consumer = PublicRmqConsumer(rmq_host, rmq_port, received_messages_queue, logger, exception_queue)
+        aio_rmq_consumer = PublicRmqConsumer(rmq_host, rmq_port, received_messages_queue, logger, exception_queue,
+                                             worker_num, metrics)
 
-        clients_sender = PublicClientsSender(received_messages_queue, clients_controller, logger, exception_queue)
+        clients_sender = PublicClientsSender(received_messages_queue, clients_controller, logger, exception_queue,
+                                             metrics)
 
         super(PublicWebsocketService, self).__init__('Public WS Service',
                                                      async_server,
@@ -49,4 +86,9 @@ class PublicWebsocketService(MainServerLoop):
                                                      clients_controller,
                                                      clients_sender,
                                                      logger,
-                                                     exception_queue)
+                                                     exception_queue,
+                                                     metrics,
+                                                     profiler,
+                                                     # asyncio's loop is used if uvloop isn't installed
+                                                     use_uvloop=True,
+                                                     executor_workers=8)
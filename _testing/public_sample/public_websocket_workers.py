@@ -0,0 +1,27 @@
+import os
+
+from logger.LoggerLoader import LoggerLoader
+from _testing.public_sample.PublicWebsocketService import PublicWebsocketService
+
+from aio_rmq_wss_proxy import WorkersSupervisor
+
+HTTP_HOST = 'localhost'
+HTTP_PORT = 9001
+
+RMQ_HOST = 'localhost'
+RMQ_PORT = 5672
+
+WORKERS_AMOUNT = os.cpu_count()
+
+
+def get_logger():
+    return LoggerLoader('public_websocket_service.log', 'DEBUG', os.getcwd() + '/').get_logger()
+
+
+def create_worker_service(worker_num: int) -> PublicWebsocketService:
+    return PublicWebsocketService(RMQ_HOST, RMQ_PORT, HTTP_HOST, HTTP_PORT, get_logger(), worker_num)
+
+
+if __name__ == '__main__':
+    supervisor = WorkersSupervisor(create_worker_service, WORKERS_AMOUNT, get_logger())
+    supervisor.run()
@@ -1,15 +1,23 @@
 import aio_pika
 import asyncio
-import json
+import functools
+import time
 
 from aio_pika import ExchangeType
+from collections import deque
 from logging import Logger
-from typing import Dict
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
 
-from . import Utils
+from .JsonCodec import JsonCodec
+from .MessagesBatch import MessagesBatch
+from .Metrics import Metrics
+from .RawMessage import RawMessage
+from .ReceivedMessage import ReceivedMessage
+from .TrafficRecorder import TrafficRecorder
+from .Transport import Transport
 
 
-class AioRmqConsumer:
+class AioRmqConsumer(Transport):
 
     def __init__(self, rmq_host: str,
                  rmq_port: int,
@@ -17,56 +25,260 @@ class AioRmqConsumer:
                  queue_name: str,
                  received_messages_queue: asyncio.Queue,
                  logger: Logger,
-                 exception_queue: asyncio.Queue):
-        self._name = Utils.format_name('AIO_RMQ_Consumer')
-        self._logger = logger
-        self._exception_queue = exception_queue
+                 exception_queue: asyncio.Queue,
+                 queue_auto_delete: bool = False,
+                 prefetch_count: int = 0,
+                 batch_size: int = 1,
+                 batch_timeout_secs: float = 0.05,
+                 codec: Optional[JsonCodec] = None,
+                 passthrough: bool = False,
+                 room_header: Optional[str] = None,
+                 passthrough_binary: bool = False,
+                 metrics: Optional[Metrics] = None,
+                 exchange_type: ExchangeType = ExchangeType.DIRECT,
+                 binding_keys: Optional[List[str]] = None,
+                 binding_arguments: Optional[Dict] = None,
+                 channels_amount: int = 1,
+                 routing_key_room_field: Optional[str] = None,
+                 name: str = 'AIO_RMQ_Consumer',
+                 ack_after_fanout: bool = False,
+                 recorder: Optional[TrafficRecorder] = None):
+        """
+        :param queue_auto_delete: queue is deleted by broker when consumer is gone,
+        useful for per worker queues bound to the same exchange and needed for server-named queues (empty queue_name),
+        which would be left collecting messages after every restart or reconnect
+        :param prefetch_count: max amount of unacked messages delivered by broker, 0 means unlimited
+        :param batch_size: if more than 1, messages are collected into MessagesBatch which is put to the queue
+        when batch_size messages are collected or batch_timeout_secs passed since the first one,
+        the whole batch is acked by one ack with multiple=True
+        :param codec: JSON codec, by default the fastest installed library is used
+        :param passthrough: messages are not decoded, their bodies are put to the queue as RawMessage
+        and sent to room's subscribers as is
+        :param room_header: passthrough message header with the room name, by default routing key is the room name
+        :param passthrough_binary: send passthrough bodies as binary frames instead of text ones
+        :param exchange_type: DIRECT, TOPIC, HEADERS or FANOUT
+        :param binding_keys: queue binding keys (e.g. 'prices.*' for TOPIC exchange),
+        by default 'route_to_{exchange_name}' for DIRECT exchange, '#' for TOPIC one and '' for the others
+        :param binding_arguments: bindings arguments, e.g. {'x-match': 'any', 'feed': 'prices'} for HEADERS exchange
+        :param channels_amount: channels consuming the queue in parallel, every one gets prefetch_count messages.
+        Messages of different channels may be handled out of order
+        :param routing_key_room_field: decoded message gets routing key as this field if the field isn't set,
+        so routing keys map straight to rooms
+        :param name: consumers of one MainServerLoop need different names
+        :param ack_after_fanout: messages are acked when clients sender is done with them instead of when they're
+        put to the queue, so at most prefetch_count messages per channel are in flight and broker holds the rest
+        while sender is behind. Needs prefetch_count
+        :param recorder: records received bodies with their rooms (routing keys or room_header values)
+        to replay them later with ReplayTransport
+        """
+        if ack_after_fanout and not prefetch_count:
+            raise ValueError('Acking after fan-out needs prefetch count')
+
+        super(AioRmqConsumer, self).__init__(name, received_messages_queue, logger, exception_queue,
+                                             codec=codec,
+                                             passthrough=passthrough,
+                                             passthrough_binary=passthrough_binary,
+                                             room_field=routing_key_room_field,
+                                             metrics=metrics)
 
-        self._received_messages_queue = received_messages_queue
+        self._room_header = room_header
+        self._recorder = recorder
 
         self._rmq_host = rmq_host
         self._rmq_port = rmq_port
         self._exchange_name = exchange_name
+        self._exchange_type = exchange_type
         self._queue_name = queue_name
+        self._queue_auto_delete = queue_auto_delete
+
+        if binding_keys is None:
+            binding_keys = [f'route_to_{exchange_name}'] if exchange_type == ExchangeType.DIRECT \
+                else ['#'] if exchange_type == ExchangeType.TOPIC else ['']
+
+        self._binding_keys = binding_keys
+        self._binding_arguments = binding_arguments
 
         self._no_ack = False
+        self._ack_after_fanout = ack_after_fanout
+
+        self._prefetch_count = prefetch_count
+        self._channels_amount = channels_amount
+
+        # batches are collected by channel, since ack with multiple=True acks messages of its channel only
+        self._batch_size = batch_size
+        self._batch_timeout_secs = batch_timeout_secs
+        self._batches = [ReceivedMessage(MessagesBatch()) for _ in range(channels_amount)]
+        self._batches_last_messages: List[Optional[aio_pika.abc.AbstractIncomingMessage]] = [None] * channels_amount
+        self._batches_timers: List[Optional[asyncio.Task]] = [None] * channels_amount
+        # batches put to the queue and not acked yet as [last message, done] by channel, in order they were put:
+        # batch is acked with multiple=True only when all the batches before it are done
+        self._batches_unacked: List[Deque[list]] = [deque() for _ in range(channels_amount)]
 
         self._conn = None
         self._channel = None
+        self._channels = []
         self._exchange = None
         self._queue = None
+        self._queues = []
 
-    @property
-    def name(self) -> str:
-        return self._name
+    def _get_message_room(self, message: aio_pika.abc.AbstractIncomingMessage) -> Optional[str]:
+        if not self._room_header:
+            return message.routing_key
 
-    def _check_message(self, message_json: Dict) -> str:
-        """
-        You can override this method for your own message check
-        """
-        return ''
+        room = message.headers.get(self._room_header)
+        return room.decode('utf-8') if isinstance(room, bytes) else room
 
-    async def _process_message(self, body: bytes):
-        self._logger.info(f'{self.name} R < {body}')
+    def _get_raw_message(self, message: aio_pika.abc.AbstractIncomingMessage) -> Optional[RawMessage]:
+        return self._make_raw_message(self._get_message_room(message), message.body)
 
-        message_json = json.loads(body)
+    async def _process_raw_message(self, message: aio_pika.abc.AbstractIncomingMessage,
+                                   on_done: Optional[Callable[[], Awaitable[None]]] = None) -> bool:
+        raw_message = self._get_raw_message(message)
 
-        err = self._check_message(message_json)
+        if raw_message is None:
+            return False
 
-        if err:
-            self._logger.error(f'{self.name} R < Error: {err}. Message: {body}')
-            return
+        await self._put(raw_message, on_done)
+
+        return True
 
-        await self._received_messages_queue.put(message_json)
+    async def _ack(self, message: aio_pika.abc.AbstractIncomingMessage, multiple: bool = False):
+        try:
+            await message.ack(multiple=multiple)
+        except Exception as ex:
+            # channel is closed, broker delivers unacked messages again
+            self._logger.warning(f'{self.name} Ack Failed. Reason: {ex}')
 
     async def _message_handler(self, message: aio_pika.abc.AbstractIncomingMessage):
-        async with message.process(ignore_processed=True):
-            try:
-                await self._process_message(message.body)
+        if self._metrics:
+            self._metrics.inc(Metrics.RMQ_RECEIVED)
+
+        if self._recorder:
+            self._recorder.record(message.body, self._get_message_room(message))
+
+        on_done = functools.partial(self._ack, message) if self._ack_after_fanout else None
+
+        try:
+            if self._passthrough:
+                put = await self._process_raw_message(message, on_done)
+            else:
+                put = await self._process_message(message.body, message.routing_key, on_done)
+
+            # otherwise clients sender acks it when it's done
+            if on_done is None or not put:
                 await message.ack()
-            except Exception as ex:
-                await message.reject()
-                await self._exception_queue.put((self.name, 'Error in Message', ex))
+
+        except Exception as ex:
+            await message.reject()
+
+            if self._metrics:
+                self._metrics.inc(Metrics.RMQ_REJECTED)
+
+            await self._exception_queue.put((self.name, 'Error in Message', ex))
+
+    async def _flush_batch(self, channel_num: int = 0):
+        if self._batches_timers[channel_num]:
+            self._batches_timers[channel_num].cancel()
+            self._batches_timers[channel_num] = None
+
+        batch, last_message = self._batches[channel_num], self._batches_last_messages[channel_num]
+        self._batches[channel_num] = ReceivedMessage(MessagesBatch())
+        self._batches_last_messages[channel_num] = None
+
+        if not self._ack_after_fanout:
+            if batch.message:
+                await self._received_messages_queue.put(batch)
+
+            if last_message:
+                # acks all the messages of the batch at once
+                await last_message.ack(multiple=True)
+
+            return
+
+        if not last_message:
+            return
+
+        unacked_batch = [last_message, False]
+        self._batches_unacked[channel_num].append(unacked_batch)
+
+        if batch.message:
+            batch.on_done = functools.partial(self._batch_done, channel_num, unacked_batch)
+            await self._received_messages_queue.put(batch)
+        else:
+            await self._batch_done(channel_num, unacked_batch)
+
+    async def _batch_done(self, channel_num: int, unacked_batch: list):
+        unacked_batch[1] = True
+
+        unacked_batches = self._batches_unacked[channel_num]
+        # channel is reopened after reconnect, delivery tags of the old one mean nothing to the new one
+        channels_last_messages = {}
+
+        while unacked_batches and unacked_batches[0][1]:
+            last_message = unacked_batches.popleft()[0]
+            channels_last_messages[id(last_message.channel)] = last_message
+
+        # acks all the done batches at once
+        for last_message in channels_last_messages.values():
+            await self._ack(last_message, multiple=True)
+
+    async def _flush_batch_later(self, channel_num: int):
+        try:
+            await asyncio.sleep(self._batch_timeout_secs)
+            self._batches_timers[channel_num] = None
+            await self._flush_batch(channel_num)
+
+        except asyncio.CancelledError:
+            return
+
+        except Exception as ex:
+            await self._exception_queue.put((self.name, 'Flushing Batch', ex))
+
+    async def _batch_message_handler(self, message: aio_pika.abc.AbstractIncomingMessage, channel_num: int = 0):
+        if self._metrics:
+            self._metrics.inc(Metrics.RMQ_RECEIVED)
+
+        if self._recorder:
+            self._recorder.record(message.body, self._get_message_room(message))
+
+        try:
+            if self._passthrough:
+                message_json = self._get_raw_message(message)
+            else:
+                message_json = self._parse_message(message.body)
+
+                if self._room_field and message_json is not None:
+                    self._set_message_room(message_json, message.routing_key)
+        except Exception as ex:
+            await message.reject()
+
+            if self._metrics:
+                self._metrics.inc(Metrics.RMQ_REJECTED)
+
+            await self._exception_queue.put((self.name, 'Error in Message', ex))
+            return
+
+        batch = self._batches[channel_num]
+
+        if message_json is not None:
+            if not batch.message:
+                # batch latency is counted from its first message
+                batch.received_at = time.monotonic()
+
+            batch.message.append(message_json)
+
+        self._batches_last_messages[channel_num] = message
+
+        try:
+            if len(batch.message) >= self._batch_size:
+                await self._flush_batch(channel_num)
+
+            elif self._batches_timers[channel_num] is None:
+                self._batches_timers[channel_num] = asyncio.get_running_loop().create_task(
+                    self._flush_batch_later(channel_num))
+
+        except Exception as ex:
+            await self._exception_queue.put((self.name, 'Flushing Batch', ex))
 
     async def _init_conn(self):
         self._logger.info(f'{self.name} Connecting to RMQ: {self._rmq_host}:{self._rmq_port}')
@@ -74,27 +286,52 @@ class AioRmqConsumer:
         self._logger.info(f'{self.name} Connection Established: {self._rmq_host}:{self._rmq_port}')
 
     async def _init_channel(self):
-        self._logger.debug(f'{self.name} Openning Channel')
-        self._channel = await self._conn.channel()
-        self._logger.debug(f'{self.name} Channel Opened')
+        for channel_num in range(self._channels_amount):
+            self._logger.debug(f'{self.name} Openning Channel {channel_num}')
+            channel = await self._conn.channel()
+            self._logger.debug(f'{self.name} Channel {channel_num} Opened')
+
+            if self._prefetch_count:
+                await channel.set_qos(prefetch_count=self._prefetch_count)
+                self._logger.debug(f'{self.name} Channel {channel_num} Prefetch Count: {self._prefetch_count}')
+
+            self._channels.append(channel)
+
+        self._channel = self._channels[0]
 
     async def _init_exchange(self):
-        self._logger.debug(f'{self.name} Declaring DIRECT exchange: {self._exchange_name}')
-        self._exchange = await self._channel.declare_exchange(self._exchange_name, ExchangeType.DIRECT)
-        self._logger.debug(f'{self.name} DIRECT exchange Declared: {self._exchange_name}')
+        exchange_type = ExchangeType(self._exchange_type).name
+
+        self._logger.debug(f'{self.name} Declaring {exchange_type} exchange: {self._exchange_name}')
+        self._exchange = await self._channel.declare_exchange(self._exchange_name, self._exchange_type)
+        self._logger.debug(f'{self.name} {exchange_type} exchange Declared: {self._exchange_name}')
 
     async def _init_queue(self):
         self._logger.debug(f'{self.name} Declaring Queue: {self._queue_name}')
-        self._queue = await self._channel.declare_queue(self._queue_name)
-        self._logger.debug(f'{self.name} Queue Declared: {self._queue_name}')
+        self._queue = await self._channel.declare_queue(self._queue_name, auto_delete=self._queue_auto_delete)
+        self._logger.debug(f'{self.name} Queue Declared: {self._queue.name}')
+
+        self._queues = [self._queue]
+
+        # other channels consume the same queue (server named one included)
+        for channel in self._channels[1:]:
+            self._queues.append(await channel.declare_queue(self._queue.name, auto_delete=self._queue_auto_delete))
 
     async def _init_bindings(self):
-        binding_key = f'route_to_{self._exchange_name}'
-        self._logger.debug(f'{self.name} Creating Binding Key: {binding_key}')
-        await self._queue.bind(self._exchange, binding_key)
-        self._logger.debug(f'{self.name} Binding Key Created: {binding_key}')
+        for binding_key in self._binding_keys:
+            self._logger.debug(f'{self.name} Creating Binding Key: {binding_key}')
+            await self._queue.bind(self._exchange, binding_key, arguments=self._binding_arguments)
+            self._logger.debug(f'{self.name} Binding Key Created: {binding_key}')
 
     async def _close_conn(self):
+        for channel_num, batch_timer in enumerate(self._batches_timers):
+            if batch_timer:
+                batch_timer.cancel()
+                self._batches_timers[channel_num] = None
+
+        if self._recorder:
+            await self._recorder.close()
+
         if self._conn:
             self._logger.info(f'{self.name} Closing Connection')
             await self._conn.close()
@@ -108,7 +345,13 @@ class AioRmqConsumer:
             await self._init_queue()
             await self._init_bindings()
 
-            await self._queue.consume(callback=self._message_handler, no_ack=self._no_ack)
+            for channel_num, queue in enumerate(self._queues):
+                if self._batch_size > 1:
+                    message_handler = functools.partial(self._batch_message_handler, channel_num=channel_num)
+                else:
+                    message_handler = self._message_handler
+
+                await queue.consume(callback=message_handler, no_ack=self._no_ack)
 
             return True
 
@@ -1,9 +1,11 @@
+import socket
 import websockets
 
 from logging import Logger
-from typing import Type, Callable, Coroutine
+from typing import Type, Callable, Coroutine, Optional
 
 from . import Utils
+from .DeflateCompression import DeflateCompression
 
 from websockets.server import WebSocketServerProtocol
 
@@ -14,7 +16,19 @@ class AsyncServer:
                  websocket_protocol_class: Type[WebSocketServerProtocol],
                  host: str,
                  port: int,
-                 logger: Logger):
+                 logger: Logger,
+                 reuse_port: bool = False,
+                 sock: Optional[socket.socket] = None,
+                 compression: Optional[DeflateCompression] = None,
+                 recv_buffer_size: Optional[int] = None,
+                 send_buffer_size: Optional[int] = None):
+        """
+        :param reuse_port: bind with SO_REUSEPORT, so several worker processes can listen on the same port
+        :param sock: already bound listening socket (e.g. inherited from parent process), host and port are ignored
+        :param compression: permessage-deflate settings, by default websockets defaults are used
+        :param recv_buffer_size: SO_RCVBUF of the listening socket, accepted connections inherit it, OS default if None
+        :param send_buffer_size: SO_SNDBUF of the listening socket, accepted connections inherit it, OS default if None
+        """
         self._name = Utils.format_name('AsyncWSS')
 
         self._logger = logger
@@ -22,10 +36,17 @@ class AsyncServer:
         self._host = host
         self._port = port
 
-        self._future_inst = websockets.serve(ws_handler=ws_handler,
-                                             host=self._host,
-                                             port=self._port,
-                                             create_protocol=websocket_protocol_class)
+        self._buffers_sizes = {socket.SO_RCVBUF: recv_buffer_size, socket.SO_SNDBUF: send_buffer_size}
+
+        # server is created in run(), so it is bound to the loop the server runs in
+        self._serve_kwargs = dict(ws_handler=ws_handler,
+                                  create_protocol=websocket_protocol_class,
+                                  **(compression.get_serve_kwargs() if compression is not None else {}))
+
+        if sock is not None:
+            self._serve_kwargs['sock'] = sock
+        else:
+            self._serve_kwargs.update(host=self._host, port=self._port, reuse_port=reuse_port or None)
 
         self._running_inst = None
 
@@ -33,8 +54,15 @@ class AsyncServer:
     def name(self):
         return self._name
 
+    def _set_buffers_sizes(self):
+        for listening_socket in self._running_inst.sockets:
+            for option, size in self._buffers_sizes.items():
+                if size:
+                    listening_socket.setsockopt(socket.SOL_SOCKET, option, size)
+
     async def run(self):
-        self._running_inst = await self._future_inst
+        self._running_inst = await websockets.serve(**self._serve_kwargs)
+        self._set_buffers_sizes()
         self._logger.warning(f'{self.name} Started [HOST: {self._host} PORT: {self._port}]')
 
     def stop(self):
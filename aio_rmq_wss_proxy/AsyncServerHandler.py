@@ -1,12 +1,18 @@
 import asyncio
-import json
 import uuid
 
 from logging import Logger
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
 
 from . import Utils, ClientsController
+from .HotPathLog import HotPathLog
+from .JsonCodec import JsonCodec
+from .Metrics import Metrics
+from .PreparedMessage import PreparedMessage
 from .SecuredWebsocketServerProtocol import SecuredWebsocketServerProtocol
+from .WireCodec import WireCodec
+
+from websockets.frames import Opcode
 
 from websockets.exceptions import ConnectionClosedOK as WS_ConnectionClosedOK, \
     ConnectionClosedError as WS_ConnectionClosedError
@@ -16,11 +22,17 @@ class AsyncServerHandler:
 
     def __init__(self, clients_controller: ClientsController,
                  logger: Logger,
-                 exception_queue: asyncio.Queue):
+                 exception_queue: asyncio.Queue,
+                 codec: Optional[JsonCodec] = None,
+                 metrics: Optional[Metrics] = None):
         self._name = Utils.format_name('AsyncWSHandler')
 
         self._clients_controller = clients_controller
         self._logger = logger
+        self._log_received = HotPathLog(logger)
+
+        self._codec = codec or JsonCodec()
+        self._metrics = metrics
 
         self._exception_queue = exception_queue
 
@@ -38,14 +50,50 @@ class AsyncServerHandler:
         """
         raise NotImplementedError()
 
-    def _parse_message(self, message: str) -> Tuple[Optional[Dict], str]:
+    def _parse_message(self, message: Union[str, bytes],
+                       wire_format: str = WireCodec.JSON) -> Tuple[Optional[Dict], str]:
         try:
-            json_obj = json.loads(message)
+            if wire_format == WireCodec.JSON:
+                json_obj = self._codec.loads(message)
+            else:
+                json_obj = WireCodec.get(wire_format).loads(message)
         except Exception as ex:
             return None, f'Unknown message: {message}. Reason: {str(ex)}'
 
         return json_obj, ''
 
+    def _prepare_message(self, websocket: SecuredWebsocketServerProtocol, message: Dict) -> PreparedMessage:
+        """
+        Encodes message in client's wire format
+        """
+        if websocket.wire_format == WireCodec.JSON:
+            return SecuredWebsocketServerProtocol.prepare_message(self._codec.dumps_bytes(message), Opcode.TEXT)
+
+        return WireCodec.get(websocket.wire_format).prepare(message)
+
+    async def _subscribe_with_snapshot(self, client_id: str, websocket: SecuredWebsocketServerProtocol,
+                                       room_name: str, response: Union[str, bytes, Dict]):
+        """
+        Subscribes client to the room and writes the response followed by room's snapshot at once,
+        so updates sent to the room after subscribe can't get ahead of them
+        :param response: already encoded response or dict encoded in client's wire format
+        """
+        self._clients_controller.subscribe_room(client_id, room_name)
+
+        if isinstance(response, dict):
+            websocket.write_prepared(self._prepare_message(websocket, response))
+        else:
+            websocket.write_prepared(SecuredWebsocketServerProtocol.prepare_message(response))
+
+        for key, message in self._clients_controller.get_room_snapshot(room_name):
+            if websocket.wire_format != WireCodec.JSON:
+                message = message.in_format(WireCodec.get(websocket.wire_format))
+
+            websocket.write_prepared(message, key)
+
+        if not websocket.has_outbound_queue:
+            await websocket.drain()
+
     def _add_client(self, websocket: SecuredWebsocketServerProtocol) -> Tuple[str, str]:
         client_id = str(uuid.uuid4())
         client_ip = websocket.client_ip
@@ -76,9 +124,12 @@ class AsyncServerHandler:
         while True:
             try:
                 message = await websocket.recv()
-                self._logger.debug(f'{self.name} R < {message}')
+                self._log_received('%s R < %s', self.name, message)
+
+                if self._metrics:
+                    self._metrics.inc(Metrics.CLIENTS_COMMANDS)
 
-                json_obj, err = self._parse_message(message)
+                json_obj, err = self._parse_message(message, websocket.wire_format)
 
                 if err:
                     self._logger.warning(f'{self.name} parse message error: {err}')
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .Metrics import Metrics
+
+
+class AuthCache:
+    """
+
+    Authentication decisions (token -> user id, token + IP address, token + device -> allowed) cached for ttl_secs,
+    rejections are cached for negative_ttl_secs. At most max_size decisions are kept in least recently used order.
+    Concurrent checks of the same key (e.g. reconnect storm of one user) wait for the single check in flight
+
+    """
+    # result of the check in flight whose handshake was cancelled, waiters check again
+    _CHECK_CANCELLED = object()
+
+    def __init__(self, ttl_secs: float = 60,
+                 negative_ttl_secs: float = 5,
+                 max_size: int = 10000,
+                 metrics: Optional[Metrics] = None):
+        """
+        :param negative_ttl_secs: rejections aren't cached if 0
+        """
+        if max_size <= 0:
+            raise ValueError(f'Auth cache size must be positive: {max_size}')
+
+        self._ttl_secs = ttl_secs
+        self._negative_ttl_secs = negative_ttl_secs
+        self._max_size = max_size
+
+        # key -> (expiration monotonic time, decision)
+        self._decisions: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._checks_in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits_amount = 0
+        self.misses_amount = 0
+
+        self._metrics = metrics
+
+        if metrics:
+            metrics.add_counter(Metrics.AUTH_CACHE_HITS, 'Authentication decisions found in cache')
+            metrics.add_counter(Metrics.AUTH_CACHE_MISSES, 'Authentication decisions checked by validators')
+            metrics.add_gauge(Metrics.AUTH_CACHE_SIZE, 'Cached authentication decisions', self.__len__)
+
+    def __len__(self) -> int:
+        return len(self._decisions)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        :return: if decision is cached and the decision
+        """
+        cached = self._decisions.get(key)
+
+        if cached is None:
+            return False, None
+
+        if cached[0] <= time.monotonic():
+            del self._decisions[key]
+            return False, None
+
+        self._decisions.move_to_end(key)
+
+        return True, cached[1]
+
+    def put(self, key: Hashable, decision: Any):
+        """
+        Falsy decision is a rejection
+        """
+        ttl_secs = self._ttl_secs if decision else self._negative_ttl_secs
+
+        if ttl_secs <= 0:
+            self._decisions.pop(key, None)
+            return
+
+        self._decisions[key] = (time.monotonic() + ttl_secs, decision)
+        self._decisions.move_to_end(key)
+
+        while len(self._decisions) > self._max_size:
+            self._decisions.popitem(last=False)
+
+    def remove(self, key: Hashable):
+        self._decisions.pop(key, None)
+
+    def clear(self):
+        self._decisions.clear()
+
+    async def get_or_check(self, key: Hashable, check: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        :param check: makes the decision if it isn't cached, its errors aren't cached
+        :return: cached or just made decision
+        """
+        while True:
+            found, decision = self.get(key)
+
+            if found:
+                self._count_hit()
+                return decision
+
+            check_in_flight = self._checks_in_flight.get(key)
+
+            if check_in_flight is None:
+                break
+
+            decision = await asyncio.shield(check_in_flight)
+
+            if decision is not AuthCache._CHECK_CANCELLED:
+                self._count_hit()
+                return decision
+
+            # the handshake making the check was cancelled, this one wasn't and checks on its own
+
+        self.misses_amount += 1
+
+        if self._metrics:
+            self._metrics.inc(Metrics.AUTH_CACHE_MISSES)
+
+        check_in_flight = self._checks_in_flight[key] = asyncio.get_running_loop().create_future()
+
+        try:
+            decision = await check()
+
+        except asyncio.CancelledError:
+            check_in_flight.set_result(AuthCache._CHECK_CANCELLED)
+            raise
+
+        except Exception as ex:
+            check_in_flight.set_exception(ex)
+            # nobody may wait for it
+            check_in_flight.exception()
+            raise
+
+        else:
+            self.put(key, decision)
+            check_in_flight.set_result(decision)
+            return decision
+
+        finally:
+            self._checks_in_flight.pop(key, None)
+
+    def _count_hit(self):
+        self.hits_amount += 1
+
+        if self._metrics:
+            self._metrics.inc(Metrics.AUTH_CACHE_HITS)
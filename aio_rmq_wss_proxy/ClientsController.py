@@ -1,9 +1,13 @@
 import asyncio
 from logging import Logger
 
-from typing import List, Tuple, Dict
+from typing import Collection, Hashable, List, Tuple, Dict, Set, Optional
 
 from . import Utils
+from .Metrics import Metrics
+from .PreparedMessage import PreparedMessage
+from .RoomsSnapshots import RoomsSnapshots
+from .RoomsTrie import RoomsTrie
 from .SecuredWebsocketServerProtocol import SecuredWebsocketServerProtocol
 
 
@@ -11,30 +15,93 @@ class ClientsController:
 
     def __init__(self, rooms: Dict,
                  logger: Logger,
-                 exception_queue: asyncio.Queue):
+                 exception_queue: asyncio.Queue,
+                 metrics: Optional[Metrics] = None,
+                 dynamic_rooms: bool = False,
+                 snapshots: Optional[RoomsSnapshots] = None):
+        """
+        :param rooms: rooms existing all the time
+        :param dynamic_rooms: any other room is created on the first subscribe and freed when the last client leaves,
+        clients can also subscribe to patterns like "trades.BTC.*" or "trades.#" (see RoomsTrie)
+        :param snapshots: cache of rooms last updates, filled by ClientsSender and sent to clients after subscribe
+        """
         self._name = Utils.format_name('ClientController')
 
-        self._rooms = rooms
-        self._clients = {}
+        # room -> subscribed clients ids and their websockets in subscription order
+        self._rooms: Dict[str, Dict[str, SecuredWebsocketServerProtocol]] = {room_name: {} for room_name in rooms}
+        self._static_rooms: Set[str] = set(rooms)
+        self._clients: Dict[str, SecuredWebsocketServerProtocol] = {}
+
+        self._dynamic_rooms = dynamic_rooms
+        self._rooms_patterns = RoomsTrie()
+
+        self._snapshots = snapshots
+
+        # client id -> rooms and patterns it's subscribed to, so leaving client doesn't scan all the rooms
+        self._clients_rooms: Dict[str, Set[str]] = {}
 
         self._logger = logger
         self._exception_queue = exception_queue
 
+        self._metrics = metrics
+
+        if metrics:
+            metrics.add_gauge(Metrics.CLIENTS_CONNECTED, 'Connected websocket clients', self.get_clients_amount)
+            # static rooms only: dynamic rooms are created by clients, so their amount of labels isn't bounded
+            metrics.add_gauge(Metrics.ROOM_SUBSCRIBERS, 'Subscribers by static room',
+                              lambda: {room_name: len(self._rooms[room_name]) for room_name in self._static_rooms},
+                              label='room')
+            metrics.add_gauge(Metrics.OUTBOUND_QUEUES_DEPTH, 'Messages waiting in all clients outbound queues',
+                              lambda: sum(self.get_outbound_queues_depths().values()))
+
+            if snapshots is not None:
+                metrics.add_gauge(Metrics.SNAPSHOTS_BYTES, 'Size of rooms snapshots', lambda: snapshots.bytes_amount)
+
+        # disconnected clients are removed by connection close event, check_clients is just a safety net
+        # which checks at most check_batch_size clients every timeout_secs
         self._timeout_secs = 5
+        self._check_batch_size = 1000
+        self._clients_to_check: List[str] = []
 
     @property
     def name(self):
         return self._name
 
-    def get_receivers(self, room: str) -> List[Tuple[str, SecuredWebsocketServerProtocol]]:
-        clients_ids = self._rooms[room]
+    @property
+    def dynamic_rooms(self) -> bool:
+        return self._dynamic_rooms
+
+    def get_receivers(self, room: str) -> Collection[Tuple[str, SecuredWebsocketServerProtocol]]:
+        """
+        :return: live view of room's subscribers, a new collection is built only if patterns match the room
+        """
+        room_clients = self._rooms.get(room)
+
+        if not self._rooms_patterns:
+            return room_clients.items() if room_clients is not None else ()
+
+        receivers = self._rooms_patterns.match(room)
 
-        receivers = []
+        if not receivers:
+            return room_clients.items() if room_clients is not None else ()
 
-        for client_id in clients_ids:
-            receivers.append((client_id, self._clients[client_id]))
+        if room_clients:
+            receivers.update(room_clients)
 
-        return receivers
+        return receivers.items()
+
+    @property
+    def has_snapshots(self) -> bool:
+        return self._snapshots is not None
+
+    def save_room_snapshot(self, room: str, message: PreparedMessage, key: Optional[Hashable] = None):
+        self._snapshots.save(room, message, key)
+
+    def get_room_snapshot(self, room: str) -> List[Tuple[Optional[Hashable], PreparedMessage]]:
+        """
+        :return: room's last updates as (key, message), nothing for patterns
+        """
+        return self._snapshots.get(room) if self._snapshots is not None else []
 
     def check_clients_exist(self) -> bool:
         return len(self._clients) > 0
@@ -42,6 +109,10 @@ class ClientsController:
     def get_clients_amount(self) -> int:
         return len(self._clients)
 
+    def get_outbound_queues_depths(self) -> Dict[str, int]:
+        return {client_id: websocket.outbound_queue_depth
+                for client_id, websocket in self._clients.items() if websocket.has_outbound_queue}
+
     def clean_disconnected_clients(self) -> List[str]:
         lost_clients_ids = []
 
@@ -50,44 +121,100 @@ class ClientsController:
                 lost_clients_ids.append(client_id)
 
         for client_id in lost_clients_ids:
-            self._clients.pop(client_id)
+            self.remove_client(client_id)
+
+        return lost_clients_ids
+
+    def _check_clients_batch(self) -> List[str]:
+        if not self._clients_to_check:
+            self._clients_to_check = list(self._clients)
+
+        batch = self._clients_to_check[-self._check_batch_size:]
+        del self._clients_to_check[-self._check_batch_size:]
+
+        lost_clients_ids = []
+
+        for client_id in batch:
+            websocket = self._clients.get(client_id)
 
-            for room_key in self._rooms:
-                room = self._rooms[room_key]
-                if client_id in room:
-                    room.remove(client_id)
+            if websocket is not None and websocket.closed:
+                lost_clients_ids.append(client_id)
+                self.remove_client(client_id)
 
         return lost_clients_ids
 
+    def _on_client_closed(self, client_id: str):
+        if client_id not in self._clients:
+            return
+
+        self.remove_client(client_id)
+        self._logger.debug('%s Client Connection Lost [Uuid: %s][Clients Amount: %d]',
+                           self.name, client_id, self.get_clients_amount())
+
     def add_new_client(self, client_id: str, websocket: SecuredWebsocketServerProtocol):
         self._clients[client_id] = websocket
+        websocket.add_close_callback(lambda: self._on_client_closed(client_id))
 
     def remove_client(self, client_id: str):
-        if client_id in self._clients:
-            self._clients.pop(client_id)
+        if self._clients.pop(client_id, None) is not None and self._metrics:
+            self._metrics.inc(Metrics.CLIENTS_DISCONNECTED)
+
+        for room_name in self._clients_rooms.pop(client_id, ()):
+            self._leave_room(client_id, room_name)
+
+    def _leave_room(self, client_id: str, room_name: str):
+        room_clients = self._rooms.get(room_name)
+
+        if room_clients is None:
+            self._rooms_patterns.remove(room_name, client_id)
+            return
 
-        for room_key in self._rooms:
-            room = self._rooms[room_key]
-            if client_id in room:
-                room.remove(client_id)
+        room_clients.pop(client_id, None)
+
+        if not room_clients and room_name not in self._static_rooms:
+            del self._rooms[room_name]
 
     def check_room_exist(self, room_name: str) -> bool:
         return room_name in self._rooms
 
+    def check_room_allowed(self, room_name: str) -> bool:
+        """
+        Checks if clients can subscribe to the room or pattern
+        """
+        return room_name in self._rooms or (self._dynamic_rooms and isinstance(room_name, str) and bool(room_name))
+
+    def get_client_rooms(self, client_id: str) -> Set[str]:
+        return self._clients_rooms.get(client_id, set())
+
     def subscribe_room(self, client_id: str, room_name: str):
-        if client_id not in self._rooms[room_name]:
-            self._rooms[room_name].append(client_id)
+        websocket = self._clients.get(client_id)
+
+        if websocket is None:
+            # client has already gone
+            return
+
+        if room_name not in self._rooms and self._dynamic_rooms and RoomsTrie.is_pattern(room_name):
+            self._rooms_patterns.add(room_name, client_id, websocket)
+        else:
+            self._rooms.setdefault(room_name, {})[client_id] = websocket
+
+        self._clients_rooms.setdefault(client_id, set()).add(room_name)
 
     def unsubscribe_room(self, client_id: str, room_name: str):
-        if client_id in self._rooms[room_name]:
-            self._rooms[room_name].remove(client_id)
+        client_rooms = self._clients_rooms.get(client_id)
+
+        if client_rooms is None or room_name not in client_rooms:
+            return
+
+        client_rooms.discard(room_name)
+        self._leave_room(client_id, room_name)
 
     async def check_clients(self):
         self._logger.warning(f'{self.name} Started')
 
         try:
             while True:
-                lost_clients_ids = self.clean_disconnected_clients()
+                lost_clients_ids = self._check_clients_batch()
                 clients_amount = self.get_clients_amount()
 
                 if lost_clients_ids:
@@ -1,24 +1,68 @@
 import asyncio
-import json
+import functools
+import time
 
+from collections import OrderedDict
+from contextvars import ContextVar
 from logging import Logger
-from typing import Dict, List, Tuple
+from typing import Any, Awaitable, Callable, Collection, Dict, Hashable, List, Optional, Tuple, Union
 
 from . import Utils, ClientsController
+from .HotPathLog import HotPathLog
+from .JsonCodec import JsonCodec
+from .MessagesBatch import MessagesBatch
+from .Metrics import Metrics
+from .PreparedMessage import PreparedMessage
+from .RawMessage import RawMessage
+from .ReceivedMessage import ReceivedMessage
 from .SecuredWebsocketServerProtocol import SecuredWebsocketServerProtocol
+from .WireCodec import WireCodec
 
+from websockets.frames import Opcode
 from websockets.exceptions import ConnectionClosedOK as WS_ConnectionClosedOK, \
     ConnectionClosedError as WS_ConnectionClosedError
 
 
 class ClientsSender:
+    _SEQ_MARK = object()
 
     def __init__(self,
                  name: str,
                  from_queue: asyncio.Queue,
                  clients_controller: ClientsController,
                  logger: Logger,
-                 exception_queue: asyncio.Queue):
+                 exception_queue: asyncio.Queue,
+                 send_concurrency: int = 1000,
+                 send_timeout_secs: float = 1,
+                 codec: Optional[JsonCodec] = None,
+                 conflation_key: Optional[Callable[[Any], Optional[Hashable]]] = None,
+                 room_rate_limits: Optional[Dict[str, float]] = None,
+                 default_room_rate_limit: float = 0,
+                 room_max_held_updates: int = 100,
+                 shards_amount: int = 1,
+                 room_field: str = 'room',
+                 validate_passthrough_utf8: bool = False,
+                 metrics: Optional[Metrics] = None):
+        """
+        :param send_timeout_secs: receivers without outbound queue are written concurrently, but the next update
+        waits for the slowest of them, a receiver not taking the update in send_timeout_secs is dropped.
+        Set SecuredWebsocketServerProtocol.OUTBOUND_QUEUE_SIZE so that slow receivers never hold up the sender
+        :param conflation_key: returns key of received message (e.g. room + symbol), when sender is behind
+        only the latest of the queued messages with the same key is processed, None key means no conflation
+        :param room_rate_limits: max updates per second by room, updates over the limit are held and sent
+        one by one at the room's rate: the latest one per key, the updates without key in order
+        :param default_room_rate_limit: max updates per second of rooms not listed in room_rate_limits, 0 is unlimited
+        :param room_max_held_updates: the oldest update held by a room is dropped when the room holds more.
+        Received messages aren't done (acked) while their updates are held
+        :param shards_amount: if more than 1, received messages are spread by room (see _get_shard_key)
+        across shards_amount queues, each handled by its own task: updates of a room stay ordered
+        while a heavy room doesn't hold up the others
+        :param room_field: field of decoded messages keeping their room, set consumers' room field
+        (e.g. routing_key_room_field) to it so that messages get their routing key as the room
+        :param validate_passthrough_utf8: passthrough text bodies are checked to be utf-8 and sent as binary frames
+        if they aren't, it decodes every body. Without it bodies are trusted, consumers of feeds which aren't utf-8
+        text should pass them with passthrough_binary instead
+        """
         self._name = Utils.format_name(name)
 
         self._from_queue = from_queue
@@ -27,6 +71,53 @@ class ClientsSender:
         self._logger = logger
         self._exception_queue = exception_queue
 
+        self._log_sent = HotPathLog(logger)
+
+        self._metrics = metrics
+
+        self._shards_queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(shards_amount)] \
+            if shards_amount > 1 else []
+        self._shards_tasks: List[asyncio.Task] = []
+        self._room_field = room_field
+        self._no_shard_key_logged = False
+        # bounded received messages queue keeps its backpressure: no more messages are taken from it
+        # than it can hold until the shards are done with them
+        self._shards_slots = asyncio.Semaphore(from_queue.maxsize) if shards_amount > 1 and from_queue.maxsize > 0 \
+            else None
+
+        if metrics:
+            metrics.add_gauge(Metrics.RECEIVED_QUEUE_DEPTH, 'Messages waiting in received messages queue',
+                              from_queue.qsize)
+            metrics.add_gauge(Metrics.SENDER_SHARDS_QUEUES_DEPTH, 'Messages waiting in sender shards queues',
+                              lambda: {str(shard_num): depth
+                                       for shard_num, depth in enumerate(self.get_shards_queues_depths())},
+                              label='shard')
+
+        # at most send_concurrency sends are in flight at once, a send lasting longer
+        # than send_timeout_secs means stalled client which is dropped
+        self._send_semaphore = asyncio.Semaphore(send_concurrency)
+        self._send_timeout_secs = send_timeout_secs
+
+        self._codec = codec or JsonCodec()
+        self._validate_passthrough_utf8 = validate_passthrough_utf8
+
+        self._conflation_key = conflation_key
+        self._conflated_amount = 0
+
+        self._room_rate_limits = room_rate_limits or {}
+        self._default_room_rate_limit = default_room_rate_limit
+        # room -> loop time when the room can send next update
+        self._rooms_next_send_time: Dict[str, float] = {}
+        # room -> update key -> (key, latest held update, holds of its received messages) in order the keys were held,
+        # every update without key is held under its own object()
+        self._rooms_held_updates: Dict[str, OrderedDict] = {}
+        # holds of received messages handled by the current task as [amount, on_done]: messages are done
+        # when they're handled and every update they made is sent, replaced by a newer one or dropped
+        self._handled_messages_holds: ContextVar[Optional[list]] = ContextVar('handled_messages_holds', default=None)
+        self._room_max_held_updates = room_max_held_updates
+        self._dropped_held_amount = 0
+        self._rooms_flush_tasks: Dict[str, asyncio.Task] = {}
+
     @property
     def name(self):
         return self._name
@@ -35,29 +126,212 @@ class ClientsSender:
         self._clients_controller.remove_client(client_id)
         clients_amount = self._clients_controller.get_clients_amount()
 
-        self._logger.debug(f'{self.name} Client Disconnected [Uuid: {client_id}][Clients Amount: {clients_amount}]')
+        self._logger.debug('%s Client Disconnected [Uuid: %s][Clients Amount: %d]',
+                           self.name, client_id, clients_amount)
 
-    async def _send_update(self, receivers: List[Tuple[str, SecuredWebsocketServerProtocol]], message: Dict):
-        if not len(receivers):
-            return
-
-        message = json.dumps(message)
-
-        for receiver_data in receivers:
-            client_id, receiver = receiver_data
+    def _drop_failed_client(self, client_id: str, receiver: SecuredWebsocketServerProtocol, code: int, reason: str):
+        receiver.fail_connection(code, reason)
+        self._remove_disconnected_client(client_id)
 
+    async def _send_to_receiver(self, client_id: str, receiver: SecuredWebsocketServerProtocol,
+                                message: PreparedMessage) -> bool:
+        async with self._send_semaphore:
             try:
-                await receiver.send(message)
-                self._logger.debug(f'{self.name} S > {message}')
+                await asyncio.wait_for(receiver.send_prepared(message), timeout=self._send_timeout_secs)
+                return True
+
+            except asyncio.TimeoutError:
+                self._logger.warning(f'{self.name} Client [Id:{client_id}] Send Timeout! '
+                                     f'Dropping after {self._send_timeout_secs} secs')
+                self._drop_failed_client(client_id, receiver, 1008, 'Send timeout')
 
             except WS_ConnectionClosedOK as ex:
-                self._logger.debug(f'{self.name} Client [Id:{client_id}] Disconnected! Reason: {str(ex)}')
+                self._logger.debug('%s Client [Id:%s] Disconnected! Reason: %s', self.name, client_id, ex)
                 self._remove_disconnected_client(client_id)
 
             except WS_ConnectionClosedError as ex:
-                self._logger.debug(f'{self.name} Client [Id:{client_id}] Disconnected! Reason: {str(ex)}')
+                self._logger.debug('%s Client [Id:%s] Disconnected! Reason: %s', self.name, client_id, ex)
                 self._remove_disconnected_client(client_id)
 
+            except Exception as ex:
+                # e.g. transport is already closing, one receiver's error mustn't stop the broadcast
+                self._logger.warning(f'{self.name} Client [Id:{client_id}] Send Failed! Dropping. Reason: {ex!r}')
+                self._drop_failed_client(client_id, receiver, 1011, 'Send failed')
+
+            return False
+
+    def _enqueue_to_receiver(self, client_id: str, receiver: SecuredWebsocketServerProtocol,
+                             message: PreparedMessage, key: Optional[Hashable]) -> bool:
+        """
+        Client isn't removed here since receivers are a live view of the room, caller removes it after the broadcast
+        """
+        if not receiver.enqueue_prepared(message, key):
+            self._logger.debug('%s Client [Id:%s] Disconnected or Overflowed Outbound Queue', self.name, client_id)
+            return False
+
+        return True
+
+    async def _broadcast(self, receivers: Collection[Tuple[str, SecuredWebsocketServerProtocol]],
+                         message: Union[str, bytes, PreparedMessage],
+                         key: Optional[Hashable] = None):
+        """
+        Encodes and frames message once per wire format and writes the same prepared frame to every receiver
+        of the format. Receivers with outbound queue get the message enqueued and don't hold up the sender
+        :param key: conflation key for outbound queues with CONFLATE_BY_KEY policy
+        """
+        if not len(receivers):
+            return
+
+        if isinstance(message, PreparedMessage):
+            prepared_message = message
+        else:
+            prepared_message = SecuredWebsocketServerProtocol.prepare_message(message)
+
+        sends = []
+        sent_amount = 0
+        receivers_amount = len(receivers)
+        failed_clients_ids = []
+
+        for client_id, receiver in receivers:
+            if receiver.wire_format == WireCodec.JSON:
+                receiver_message = prepared_message
+            else:
+                receiver_message = prepared_message.in_format(WireCodec.get(receiver.wire_format))
+
+            if not receiver.has_outbound_queue:
+                sends.append(self._send_to_receiver(client_id, receiver, receiver_message))
+            elif self._enqueue_to_receiver(client_id, receiver, receiver_message, key):
+                sent_amount += 1
+            else:
+                failed_clients_ids.append(client_id)
+
+        for client_id in failed_clients_ids:
+            self._remove_disconnected_client(client_id)
+
+        if sends:
+            sent_amount += sum(await asyncio.gather(*sends))
+
+        if self._metrics:
+            self._metrics.inc(Metrics.MESSAGES_SENT, sent_amount)
+            self._metrics.inc(Metrics.SEND_ERRORS, receivers_amount - sent_amount)
+
+        self._log_sent('%s S > %s [Receivers: %d]', self.name, prepared_message.data, receivers_amount)
+
+    async def _send_update(self, receivers: Collection[Tuple[str, SecuredWebsocketServerProtocol]], message: Dict,
+                           key: Optional[Hashable] = None):
+        if not len(receivers):
+            return
+
+        await self._broadcast(receivers, self._encode_update(message), key)
+
+    def _encode_update(self, message: Dict) -> PreparedMessage:
+        # encoded straight to utf-8 bytes and sent as text frame, the message is kept for the other wire formats
+        return SecuredWebsocketServerProtocol.prepare_message(self._codec.dumps_bytes(message), Opcode.TEXT, message)
+
+    async def _send_room_update_now(self, room: str, message: Union[Dict, PreparedMessage],
+                                    key: Optional[Hashable] = None):
+        receivers = self._clients_controller.get_receivers(room)
+
+        if self._clients_controller.has_snapshots:
+            # saved when it's sent: client subscribing meanwhile gets it either in the snapshot or by broadcast
+            if not isinstance(message, PreparedMessage):
+                message = self._encode_update(message)
+
+            self._clients_controller.save_room_snapshot(room, message, key)
+
+        if isinstance(message, PreparedMessage):
+            await self._broadcast(receivers, message, key)
+        else:
+            await self._send_update(receivers, message, key)
+
+    async def _flush_room_later(self, room: str, delay_secs: float):
+        try:
+            await asyncio.sleep(delay_secs)
+
+            # one held update per flush, so the room doesn't send faster than its rate limit
+            held_updates = self._rooms_held_updates[room]
+            key, message, holds = held_updates.popitem(last=False)[1]
+
+            if not held_updates:
+                del self._rooms_held_updates[room]
+
+            self._rooms_next_send_time[room] = asyncio.get_running_loop().time() + 1 / self._get_room_rate_limit(room)
+            self._rooms_flush_tasks.pop(room, None)
+
+            if self._check_room(room):
+                await self._send_room_update_now(room, message, key)
+
+            await self._release_holds(holds)
+
+            if room in self._rooms_held_updates:
+                self._schedule_room_flush(room)
+
+        except asyncio.CancelledError:
+            return
+
+        except Exception as ex:
+            self._logger.error(f'{self.name} Room [{room}] Flush Stopped because of an Error')
+            await self._exception_queue.put((self.name, 'Flushing Room Updates', ex))
+
+    def _schedule_room_flush(self, room: str):
+        if room in self._rooms_flush_tasks:
+            return
+
+        delay_secs = max(self._rooms_next_send_time.get(room, 0) - asyncio.get_running_loop().time(), 0)
+        self._rooms_flush_tasks[room] = asyncio.get_running_loop().create_task(self._flush_room_later(room, delay_secs))
+
+    def _check_room(self, room: str) -> bool:
+        # dynamic room may have no subscribers for now
+        return self._clients_controller.dynamic_rooms or self._clients_controller.check_room_exist(room)
+
+    def _get_room_rate_limit(self, room: str) -> float:
+        return self._room_rate_limits.get(room, self._default_room_rate_limit)
+
+    async def _send_room_update(self, room: str, message: Union[Dict, PreparedMessage],
+                                key: Optional[Hashable] = None):
+        """
+        Sends update to room's subscribers respecting room's rate limit.
+        Throttled updates are held and sent one by one as the room is allowed to send: held update is replaced
+        by a newer one with the same key, updates without key are sent in order.
+        A room holding more than room_max_held_updates drops the oldest one
+        :param key: update key (e.g. symbol), also used as conflation key by outbound queues
+        """
+        if not self._check_room(room):
+            self._logger.warning(f'{self.name} RMQ unknown room {room}')
+            return
+
+        rate_limit = self._get_room_rate_limit(room)
+
+        if not rate_limit:
+            await self._send_room_update_now(room, message, key)
+            return
+
+        now = asyncio.get_running_loop().time()
+
+        if room not in self._rooms_held_updates and now >= self._rooms_next_send_time.get(room, 0):
+            self._rooms_next_send_time[room] = now + 1 / rate_limit
+            await self._send_room_update_now(room, message, key)
+            return
+
+        holds = self._handled_messages_holds.get()
+
+        if holds is not None:
+            holds[0] += 1
+
+        held_updates = self._rooms_held_updates.setdefault(room, OrderedDict())
+        held_key = key if key is not None else object()
+        released_update = held_updates.get(held_key)
+        held_updates[held_key] = (key, message, holds)
+
+        if released_update is None and len(held_updates) > self._room_max_held_updates:
+            released_update = held_updates.popitem(last=False)[1]
+            self._dropped_held_amount += 1
+
+        self._schedule_room_flush(room)
+
+        if released_update is not None:
+            await self._release_holds(released_update[2])
+
     async def _process_received_message(self, message_json: Dict):
         """
         This method is for describing how do we prepare received message from RMQ
@@ -67,20 +341,257 @@ class ClientsSender:
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def _is_utf8(body: Union[bytes, str]) -> bool:
+        if isinstance(body, str):
+            return True
+
+        try:
+            body.decode('utf-8')
+            return True
+
+        except UnicodeDecodeError:
+            return False
+
+    async def _process_raw_message(self, raw_message: RawMessage):
+        """
+        Passthrough message is sent to room's subscribers as is. When validate_passthrough_utf8 is on,
+        not utf-8 text body is sent as binary frame because clients close the connection on invalid text frame
+        """
+        opcode = Opcode.BINARY if raw_message.binary else Opcode.TEXT
+
+        if opcode == Opcode.TEXT and self._validate_passthrough_utf8 and not self._is_utf8(raw_message.body):
+            self._logger.error(f'{self.name} Passthrough Message to {raw_message.room} is not UTF-8, '
+                               f'Sent as Binary. Message: {HotPathLog.truncate(raw_message.body)}')
+            opcode = Opcode.BINARY
+
+        key = self._conflation_key(raw_message) if self._conflation_key else None
+
+        await self._send_room_update(raw_message.room,
+                                     SecuredWebsocketServerProtocol.prepare_message(raw_message.body, opcode),
+                                     key)
+
+    async def _process_received_batch(self, messages_batch: MessagesBatch):
+        """
+        Batch of messages received from RMQ in batch mode, by default they're processed one by one
+        """
+        for message in messages_batch:
+            if isinstance(message, RawMessage):
+                await self._process_raw_message(message)
+            else:
+                await self._process_received_message(message)
+
+    def _conflate(self, messages: List) -> List:
+        """
+        Keeps only the latest message per conflation key, in order of the first message with the key
+        """
+        latest_messages = OrderedDict()
+        seq = 0
+
+        for queue_message in messages:
+            if isinstance(queue_message, ReceivedMessage):
+                queue_message = queue_message.message
+
+            for message in (queue_message if isinstance(queue_message, MessagesBatch) else (queue_message,)):
+                key = self._conflation_key(message)
+
+                if key is None:
+                    seq += 1
+                    key = (self._SEQ_MARK, seq)
+
+                elif key in latest_messages:
+                    self._conflated_amount += 1
+
+                latest_messages[key] = message
+
+        return list(latest_messages.values())
+
+    async def _process_queue_message(self, message: Any):
+        if isinstance(message, ReceivedMessage):
+            message = message.message
+
+        if isinstance(message, RawMessage):
+            await self._process_raw_message(message)
+        elif isinstance(message, MessagesBatch):
+            await self._process_received_batch(message)
+        else:
+            await self._process_received_message(message)
+
+    def _observe_fanout_latency(self, messages: List):
+        now = time.monotonic()
+
+        for message in messages:
+            if isinstance(message, ReceivedMessage):
+                self._metrics.observe(Metrics.FANOUT_LATENCY, now - message.received_at)
+
+    def get_conflated_amount(self) -> int:
+        return self._conflated_amount
+
+    def get_dropped_held_amount(self) -> int:
+        return self._dropped_held_amount
+
+    def get_shards_queues_depths(self) -> List[int]:
+        return [shard_queue.qsize() for shard_queue in self._shards_queues]
+
+    def _get_shard_key(self, message: Any) -> Optional[Hashable]:
+        """
+        You can override this method if received messages keep their room elsewhere,
+        messages with the same key are handled by the same shard in order they were received
+        """
+        if isinstance(message, RawMessage):
+            return message.room
+
+        return message.get(self._room_field) if isinstance(message, dict) else None
+
+    def _get_shard_num(self, message: Any) -> int:
+        shard_key = self._get_shard_key(message)
+
+        if shard_key is None and not self._no_shard_key_logged:
+            self._no_shard_key_logged = True
+            self._logger.warning(f'{self.name} Message without Shard Key, such messages are handled by one shard. '
+                                 f'Set consumers room field to "{self._room_field}" or override _get_shard_key')
+
+        return hash(shard_key) % len(self._shards_queues)
+
+    def _dispatch_to_shards(self, queue_message: Any) -> bool:
+        """
+        Batch is split into batches by shard. Received message is done when all its parts are handled
+        :return: True if there is nothing to handle and the message is already done
+        """
+        message = queue_message.message if isinstance(queue_message, ReceivedMessage) else queue_message
+
+        if isinstance(message, MessagesBatch):
+            shards_messages = {}
+
+            for batch_message in message:
+                shards_messages.setdefault(self._get_shard_num(batch_message), MessagesBatch()).append(batch_message)
+
+            if isinstance(queue_message, ReceivedMessage):
+                for shard_num, shard_batch in shards_messages.items():
+                    shards_messages[shard_num] = ReceivedMessage(shard_batch)
+                    shards_messages[shard_num].received_at = queue_message.received_at
+        else:
+            shards_messages = {self._get_shard_num(message): queue_message}
+
+        if not shards_messages:
+            return True
+
+        # amount of not handled parts of the received message
+        parts_left = [len(shards_messages)]
+
+        for shard_num, shard_message in shards_messages.items():
+            self._shards_queues[shard_num].put_nowait((shard_message, parts_left, queue_message))
+
+        return False
+
+    @staticmethod
+    async def _get_messages(queue: asyncio.Queue, drain: bool) -> List:
+        messages = [await queue.get()]
+
+        if drain:
+            # sender is behind, everything already queued is conflated
+            while not queue.empty():
+                messages.append(queue.get_nowait())
+
+        return messages
+
+    @staticmethod
+    async def _release_holds(holds: Optional[list]):
+        if holds is None:
+            return
+
+        holds[0] -= 1
+
+        if not holds[0]:
+            await holds[1]()
+
+    async def _handle_messages(self, messages: List, on_done: Callable[[], Awaitable[None]]):
+        """
+        :param on_done: called when messages are handled and none of their updates is held by rooms rate limits
+        """
+        # handling itself is the first hold
+        holds = [1, on_done]
+        holds_token = self._handled_messages_holds.set(holds)
+
+        try:
+            if self._clients_controller.check_clients_exist():
+                for message in (self._conflate(messages) if self._conflation_key else messages):
+                    await self._process_queue_message(message)
+
+                if self._metrics:
+                    self._observe_fanout_latency(messages)
+
+        finally:
+            self._handled_messages_holds.reset(holds_token)
+
+        await self._release_holds(holds)
+
+    async def _message_done(self, queue_message: Any):
+        """
+        Received message is sent to all the receivers, consumer may ack it now
+        """
+        self._from_queue.task_done()
+
+        if self._shards_slots is not None:
+            self._shards_slots.release()
+
+        if isinstance(queue_message, ReceivedMessage) and queue_message.on_done is not None:
+            await queue_message.done()
+
+    async def _messages_done(self, queue_messages: List):
+        for queue_message in queue_messages:
+            await self._message_done(queue_message)
+
+    async def _shard_messages_done(self, shard_messages: List):
+        for _, parts_left, queue_message in shard_messages:
+            parts_left[0] -= 1
+
+            if not parts_left[0]:
+                await self._message_done(queue_message)
+
+    async def _shard_handler(self, shard_num: int):
+        shard_queue = self._shards_queues[shard_num]
+
+        try:
+            while True:
+                shard_messages = await self._get_messages(shard_queue, bool(self._conflation_key))
+
+                await self._handle_messages([shard_message for shard_message, _, _ in shard_messages],
+                                            functools.partial(self._shard_messages_done, shard_messages))
+
+                for _ in shard_messages:
+                    shard_queue.task_done()
+
+        except asyncio.CancelledError:
+            return
+
+        except Exception as ex:
+            self._logger.error(f'{self.name} Shard [{shard_num}] Stopped because of an Error')
+            await self._exception_queue.put((self.name, f'Shard {shard_num} Handler', ex))
+
     async def queue_handler(self):
         self._logger.warning(f'{self.name} Started')
 
         try:
-            while True:
-                message_json = await self._from_queue.get()
+            if self._shards_queues:
+                loop = asyncio.get_running_loop()
+                self._shards_tasks = [loop.create_task(self._shard_handler(shard_num),
+                                                       name=f'Clients-Sender-Shard-{shard_num}-Task')
+                                      for shard_num in range(len(self._shards_queues))]
 
-                if not self._clients_controller.check_clients_exist():
-                    self._from_queue.task_done()
-                    continue
+                while True:
+                    if self._shards_slots is not None:
+                        await self._shards_slots.acquire()
 
-                await self._process_received_message(message_json)
+                    queue_message = await self._from_queue.get()
 
-                self._from_queue.task_done()
+                    if self._dispatch_to_shards(queue_message):
+                        await self._message_done(queue_message)
+
+            while True:
+                messages = await self._get_messages(self._from_queue, bool(self._conflation_key))
+
+                await self._handle_messages(messages, functools.partial(self._messages_done, messages))
 
         except asyncio.CancelledError:
             self._logger.warning(f'{self.name} Stopped')
@@ -90,3 +601,10 @@ class ClientsSender:
             self._logger.error(f'{self.name} Stopped because of an Error')
             await self._exception_queue.put((self.name, 'Queue Handler', ex))
             return
+
+        finally:
+            for shard_task in self._shards_tasks:
+                shard_task.cancel()
+
+            for flush_task in self._rooms_flush_tasks.values():
+                flush_task.cancel()
@@ -0,0 +1,108 @@
+import zlib
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from websockets.extensions.base import ServerExtensionFactory
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CTRL_OPCODES, Frame, OP_CONT
+
+_EMPTY_UNCOMPRESSED_BLOCK = b'\x00\x00\xff\xff'
+
+
+class _PerMessageDeflate(PerMessageDeflate):
+    """
+    Doesn't compress messages smaller than threshold, they're sent as is with rsv1 flag off
+    """
+
+    def __init__(self, compression: 'DeflateCompression', *args, **kwargs):
+        super(_PerMessageDeflate, self).__init__(*args, **kwargs)
+        self.compression = compression
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode not in CTRL_OPCODES and frame.opcode is not OP_CONT and frame.fin and \
+                len(frame.data) < self.compression.threshold:
+            return frame
+
+        return super(_PerMessageDeflate, self).encode(frame)
+
+
+class _ServerPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+
+    def __init__(self, compression: 'DeflateCompression', *args, **kwargs):
+        super(_ServerPerMessageDeflateFactory, self).__init__(*args, **kwargs)
+        self._compression = compression
+
+    def process_request_params(self, params, accepted_extensions) -> Tuple[List[Tuple[str, Optional[str]]], Any]:
+        response_params, extension = super(_ServerPerMessageDeflateFactory, self).process_request_params(
+            params, accepted_extensions)
+
+        return response_params, _PerMessageDeflate(self._compression,
+                                                   extension.remote_no_context_takeover,
+                                                   extension.local_no_context_takeover,
+                                                   extension.remote_max_window_bits,
+                                                   extension.local_max_window_bits,
+                                                   extension.compress_settings)
+
+
+class DeflateCompression:
+    """
+
+    permessage-deflate settings of AsyncServer.
+    In shared mode server doesn't keep compression context between messages (server_no_context_takeover),
+    so broadcast message is compressed once and the same frame is written to every client
+    which negotiated compatible parameters, the others compress it on their own
+
+    """
+
+    def __init__(self, enabled: bool = True,
+                 window_bits: int = 12,
+                 memory_level: int = 5,
+                 threshold: int = 0,
+                 shared: bool = False):
+        """
+        :param window_bits: server and client compression window size, 8..15 (2^window_bits bytes)
+        :param memory_level: zlib memory level, 1..9, more memory is a bit faster and compresses better
+        :param threshold: messages smaller than threshold bytes aren't compressed
+        :param shared: compress broadcast messages once for all the clients
+        """
+        if not 8 <= window_bits <= 15:
+            raise ValueError(f'Window bits must be in 8..15: {window_bits}')
+
+        if not 1 <= memory_level <= 9:
+            raise ValueError(f'Memory level must be in 1..9: {memory_level}')
+
+        self.enabled = enabled
+        self.window_bits = window_bits
+        self.memory_level = memory_level
+        self.threshold = threshold
+        self.shared = shared
+
+    def get_serve_kwargs(self) -> Dict[str, Any]:
+        """
+        :return: compression arguments of websockets.serve
+        """
+        if not self.enabled:
+            return {'compression': None}
+
+        extensions: List[ServerExtensionFactory] = [
+            _ServerPerMessageDeflateFactory(self,
+                                            server_no_context_takeover=self.shared,
+                                            server_max_window_bits=self.window_bits,
+                                            client_max_window_bits=self.window_bits,
+                                            compress_settings={'memLevel': self.memory_level})
+        ]
+
+        return {'compression': 'deflate', 'extensions': extensions}
+
+    def can_share(self, extension) -> bool:
+        """
+        Checks if connection with the negotiated extension can get frames compressed once for all
+        """
+        return self.shared and isinstance(extension, _PerMessageDeflate) and extension.compression is self and \
+            extension.local_no_context_takeover and extension.local_max_window_bits >= self.window_bits
+
+    def compress(self, data: bytes) -> bytes:
+        encoder = zlib.compressobj(wbits=-self.window_bits, memLevel=self.memory_level)
+        data = encoder.compress(data) + encoder.flush(zlib.Z_SYNC_FLUSH)
+
+        return data[:-4] if data.endswith(_EMPTY_UNCOMPRESSED_BLOCK) else data
@@ -0,0 +1,45 @@
+import logging
+
+from logging import Logger
+
+
+class HotPathLog:
+    """
+
+    Logging of per message events (received / sent messages).
+    Nothing is formatted unless the level is enabled, only every SAMPLE_EVERY-th event is logged
+    and payloads (str, bytes) are truncated to PAYLOAD_MAX_LENGTH.
+    ENABLED = False switches all hot path logging off whatever the logger level is
+
+    """
+    ENABLED = True
+    SAMPLE_EVERY = 1
+    PAYLOAD_MAX_LENGTH = 512
+
+    def __init__(self, logger: Logger, level: int = logging.DEBUG):
+        self._logger = logger
+        self._level = level
+        self._counter = 0
+
+    @staticmethod
+    def truncate(payload):
+        if not isinstance(payload, (str, bytes)) or len(payload) <= HotPathLog.PAYLOAD_MAX_LENGTH:
+            return payload
+
+        return f'{payload[:HotPathLog.PAYLOAD_MAX_LENGTH]}... [{len(payload)} total]'
+
+    def __call__(self, msg: str, *args):
+        """
+        :param msg: %-style message format
+        :param args: format arguments, str and bytes ones are truncated
+        """
+        if not HotPathLog.ENABLED or not self._logger.isEnabledFor(self._level):
+            return
+
+        self._counter += 1
+
+        if self._counter < HotPathLog.SAMPLE_EVERY:
+            return
+
+        self._counter = 0
+        self._logger.log(self._level, msg, *[HotPathLog.truncate(arg) for arg in args])
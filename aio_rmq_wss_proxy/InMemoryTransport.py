@@ -0,0 +1,60 @@
+import asyncio
+
+from logging import Logger
+from typing import Any, Awaitable, Callable, Optional
+
+from .JsonCodec import JsonCodec
+from .Metrics import Metrics
+from .Transport import Transport
+
+
+class InMemoryTransport(Transport):
+    """
+
+    Transport without broker: messages are published by the same process right into received messages queue.
+    Fits tests, benchmarks and services producing the updates on their own
+
+    """
+
+    def __init__(self, received_messages_queue: asyncio.Queue,
+                 logger: Logger,
+                 exception_queue: asyncio.Queue,
+                 codec: Optional[JsonCodec] = None,
+                 passthrough: bool = False,
+                 passthrough_binary: bool = False,
+                 room_field: Optional[str] = None,
+                 metrics: Optional[Metrics] = None,
+                 name: str = 'InMemory Transport'):
+        super(InMemoryTransport, self).__init__(name, received_messages_queue, logger, exception_queue,
+                                                codec=codec,
+                                                passthrough=passthrough,
+                                                passthrough_binary=passthrough_binary,
+                                                room_field=room_field,
+                                                metrics=metrics)
+
+    async def publish(self, message: Any, on_done: Optional[Callable[[], Awaitable[None]]] = None):
+        """
+        Puts already decoded message (dict, RawMessage or MessagesBatch) to the queue,
+        waits while bounded queue is full
+        :param on_done: called by clients sender when it's done with the message
+        """
+        if self._metrics:
+            self._metrics.inc(Metrics.RMQ_RECEIVED)
+
+        await self._put(message, on_done)
+
+    async def publish_body(self, body: bytes, room: Optional[str] = None) -> bool:
+        """
+        Puts message body to the queue the way broker's message is put: decoded or passed through to the room
+        :return: False if message is dropped because of check or missing room
+        """
+        return await self._process_body(body, room)
+
+    async def consume(self):
+        try:
+            self._logger.warning(f'{self.name} Started')
+
+            await asyncio.Future()
+
+        except asyncio.CancelledError:
+            self._logger.warning(f'{self.name} Stopped')
@@ -0,0 +1,74 @@
+import importlib
+import json
+
+from typing import Any, Callable, Optional, Tuple, Type, Union
+
+
+class JsonCodec:
+    """
+    JSON encoding and decoding through the fastest installed library: orjson, ujson, msgspec or stdlib json
+    """
+    LIBRARIES = ('orjson', 'ujson', 'msgspec', 'json')
+
+    def __init__(self, library: Optional[str] = None):
+        """
+        :param library: one of LIBRARIES, by default the first installed one is used
+        """
+        if library is None:
+            library = next(name for name in JsonCodec.LIBRARIES if JsonCodec.is_available(name))
+
+        if library not in JsonCodec.LIBRARIES:
+            raise ValueError(f'Unknown JSON library: {library}')
+
+        self._library = library
+        self._module = importlib.import_module(library)
+
+        # loads accepts str and bytes, dumps returns str, dumps_bytes returns utf-8 bytes
+        if library == 'orjson':
+            self.loads = self._module.loads
+            self.dumps = lambda obj: self._module.dumps(obj).decode('utf-8')
+            self.dumps_bytes = self._module.dumps
+
+        elif library == 'ujson':
+            self.loads = self._module.loads
+            self.dumps = self._module.dumps
+            self.dumps_bytes = lambda obj: self._module.dumps(obj).encode('utf-8')
+
+        elif library == 'msgspec':
+            self.loads = self._module.json.decode
+            self.dumps = lambda obj: self._module.json.encode(obj).decode('utf-8')
+            self.dumps_bytes = self._module.json.encode
+
+        else:
+            self.loads = json.loads
+            self.dumps = json.dumps
+            self.dumps_bytes = lambda obj: json.dumps(obj).encode('utf-8')
+
+    @staticmethod
+    def is_available(library: str) -> bool:
+        try:
+            importlib.import_module(library)
+            return True
+        except ImportError:
+            return False
+
+    @property
+    def library(self) -> str:
+        return self._library
+
+    def typed_decoder(self, schema: Type) -> Callable[[Union[str, bytes]], Tuple[Optional[Any], str]]:
+        """
+        Decoder which validates data against schema (msgspec Struct, dataclass, TypedDict...) while decoding.
+        Needs msgspec whatever library is used for the rest
+        :return: decode function returning decoded object and error message
+        """
+        msgspec = importlib.import_module('msgspec')
+        decoder = msgspec.json.Decoder(schema)
+
+        def decode(data: Union[str, bytes]) -> Tuple[Optional[Any], str]:
+            try:
+                return decoder.decode(data), ''
+            except msgspec.ValidationError as ex:
+                return None, str(ex)
+
+        return decode
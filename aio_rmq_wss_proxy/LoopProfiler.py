@@ -0,0 +1,255 @@
+import asyncio
+import collections
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+from logging import Logger
+from types import FrameType
+from typing import Counter, Optional
+
+from . import Utils
+from .Metrics import Metrics
+
+
+class LoopProfiler:
+    """
+
+    Opt-in profiling of the event loop. Loop lag is measured continuously by a heartbeat task and a watchdog thread
+    catches callbacks blocking the loop longer than slow_callback_secs: their task name and stack are logged and
+    appended to "slow-callbacks.folded" by the watchdog thread, so the loop never writes files.
+    Sampling profile of the loop thread is taken on demand (signal or start_sampling())
+    into "profile-<time>-<num>.folded". Files are in folded stacks format with task name
+    as the root frame ("Clients-Sender-Task;main (x.py:1);... 12"), ready for flamegraph.pl or speedscope.
+    Slow callbacks' counts are their durations in ms, samples' counts are amounts of samples
+
+    """
+    SLOW_CALLBACKS_FILE = 'slow-callbacks.folded'
+    NO_TASK = 'No-Task'
+
+    def __init__(self, directory: str,
+                 logger: Logger,
+                 slow_callback_secs: float = 0.1,
+                 lag_interval_secs: float = 0.05,
+                 sampling_interval_secs: float = 0.005,
+                 sampling_duration_secs: float = 10,
+                 sampling_signal: Optional[int] = getattr(signal, 'SIGUSR1', None),
+                 metrics: Optional[Metrics] = None,
+                 name: str = 'Loop Profiler'):
+        """
+        :param directory: where slow callbacks and sampling profiles are written, created if missing
+        :param slow_callback_secs: loop blocked longer than it is reported with the blocking stack
+        :param lag_interval_secs: how often the heartbeat measures loop lag
+        :param sampling_signal: signal starting sampling profile, None means only start_sampling() does it
+        """
+        self._name = Utils.format_name(name)
+        self._logger = logger
+
+        self._directory = directory
+        self._slow_callback_secs = slow_callback_secs
+        self._lag_interval_secs = lag_interval_secs
+        self._sampling_interval_secs = sampling_interval_secs
+        self._sampling_duration_secs = sampling_duration_secs
+        self._sampling_signal = sampling_signal
+
+        self._metrics = metrics
+
+        if self._metrics:
+            self._metrics.add_counter(Metrics.SLOW_CALLBACKS, 'Callbacks blocking the event loop too long')
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+        # monotonic time of the last heartbeat, updated by the loop and read by the watchdog
+        self._heartbeat = 0.0
+        # (task name, folded stack) caught by the watchdog while the loop is blocked
+        self._blocking_sample: Optional[tuple] = None
+        # slow callbacks lines reported by the loop and written to the file by the watchdog
+        self._slow_callbacks_lines: queue.SimpleQueue = queue.SimpleQueue()
+
+        self._stopped = threading.Event()
+        self._watchdog_thread: Optional[threading.Thread] = None
+        self._sampling_thread: Optional[threading.Thread] = None
+
+        self.slow_callbacks_amount = 0
+        self.profiles_amount = 0
+        self.max_lag_secs = 0.0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def is_sampling(self) -> bool:
+        return self._sampling_thread is not None and self._sampling_thread.is_alive()
+
+    @staticmethod
+    def format_stack(frame: Optional[FrameType]) -> str:
+        """
+        :return: frames from the outermost to the innermost joined by ";"
+        """
+        frames = []
+
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})'.replace(';', ':'))
+            frame = frame.f_back
+
+        return ';'.join(reversed(frames))
+
+    def _get_task_name(self) -> str:
+        # the loop thread may switch tasks meanwhile, name is a hint for the stack taken right before
+        task = asyncio.current_task(self._loop)
+
+        return task.get_name() if task is not None else LoopProfiler.NO_TASK
+
+    def _take_sample(self) -> Optional[tuple]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+
+        if frame is None:
+            return None
+
+        return self._get_task_name(), LoopProfiler.format_stack(frame)
+
+    def _append(self, file_name: str, lines: str):
+        with open(os.path.join(self._directory, file_name), 'a') as file:
+            file.write(lines)
+
+    def _write_slow_callbacks(self):
+        lines = []
+
+        while not self._slow_callbacks_lines.empty():
+            lines.append(self._slow_callbacks_lines.get_nowait())
+
+        if not lines:
+            return
+
+        try:
+            self._append(LoopProfiler.SLOW_CALLBACKS_FILE, ''.join(lines))
+        except OSError as ex:
+            self._logger.error(f'{self.name} Writing Slow Callbacks Failed. Reason: {ex}')
+
+    def _watchdog(self):
+        watched_heartbeat = None
+
+        while not self._stopped.wait(self._slow_callback_secs / 2):
+            heartbeat = self._heartbeat
+
+            # one sample per blocking, taken while the blocking callback is still running
+            if heartbeat != watched_heartbeat and \
+                    time.monotonic() - heartbeat > self._lag_interval_secs + self._slow_callback_secs:
+                watched_heartbeat = heartbeat
+                self._blocking_sample = self._take_sample()
+
+            self._write_slow_callbacks()
+
+        self._write_slow_callbacks()
+
+    def _report_slow_callback(self, lag_secs: float):
+        self.slow_callbacks_amount += 1
+
+        if self._metrics:
+            self._metrics.inc(Metrics.SLOW_CALLBACKS)
+
+        sample, self._blocking_sample = self._blocking_sample, None
+        task_name, stack = sample if sample else (LoopProfiler.NO_TASK, 'unknown')
+
+        self._logger.warning(f'{self.name} Loop Blocked for {lag_secs * 1000:.0f}ms by {task_name} '
+                             f'at {stack.rsplit(";", 1)[-1]}')
+
+        # the loop is already late, the file is written by the watchdog
+        self._slow_callbacks_lines.put_nowait(f'{task_name};{stack} {max(round(lag_secs * 1000), 1)}\n')
+
+    def _sample(self, file_name: str):
+        samples: Counter[str] = collections.Counter()
+        finish = time.monotonic() + self._sampling_duration_secs
+
+        while time.monotonic() < finish and not self._stopped.wait(self._sampling_interval_secs):
+            sample = self._take_sample()
+
+            if sample:
+                samples[';'.join(sample)] += 1
+
+        try:
+            self._append(file_name, ''.join(f'{stack} {amount}\n' for stack, amount in samples.items()))
+            self._logger.warning(f'{self.name} Sampling Finished [Samples: {sum(samples.values())}][File: {file_name}]')
+
+        except OSError as ex:
+            self._logger.error(f'{self.name} Writing Profile Failed. Reason: {ex}')
+
+    def start_sampling(self) -> bool:
+        """
+        Starts sampling the loop thread for sampling_duration_secs in a separate thread
+        :return: False if sampling is in progress or profiler isn't running
+        """
+        if self._loop is None or self.is_sampling:
+            return False
+
+        self.profiles_amount += 1
+        file_name = f'profile-{time.strftime("%Y%m%d-%H%M%S")}-{self.profiles_amount}.folded'
+        self._logger.warning(f'{self.name} Sampling Started [Duration: {self._sampling_duration_secs}s]')
+
+        self._sampling_thread = threading.Thread(target=self._sample, args=(file_name,),
+                                                 name='Loop-Profiler-Sampling', daemon=True)
+        self._sampling_thread.start()
+
+        return True
+
+    def _start(self):
+        os.makedirs(self._directory, exist_ok=True)
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+
+        self._watchdog_thread = threading.Thread(target=self._watchdog, name='Loop-Profiler-Watchdog', daemon=True)
+        self._watchdog_thread.start()
+
+        if self._sampling_signal is not None:
+            try:
+                self._loop.add_signal_handler(self._sampling_signal, self.start_sampling)
+            except (NotImplementedError, RuntimeError, ValueError):
+                self._logger.error(f'{self.name} Sampling Signal is not Supported')
+                self._sampling_signal = None
+
+    def _stop(self):
+        self._stopped.set()
+
+        if self._sampling_signal is not None:
+            self._loop.remove_signal_handler(self._sampling_signal)
+
+        for thread in (self._watchdog_thread, self._sampling_thread):
+            if thread is not None:
+                thread.join()
+
+        self._loop = None
+
+    async def run(self):
+        """
+        Heartbeat measuring loop lag, the watchdog and the sampling signal handler live while it runs
+        """
+        self._start()
+        self._logger.warning(f'{self.name} Started [Directory: {self._directory}]'
+                             f'[Slow Callback: {self._slow_callback_secs * 1000:.0f}ms]')
+
+        try:
+            while True:
+                await asyncio.sleep(self._lag_interval_secs)
+
+                now = time.monotonic()
+                lag_secs = max(now - self._heartbeat - self._lag_interval_secs, 0)
+                self._heartbeat = now
+
+                self.max_lag_secs = max(self.max_lag_secs, lag_secs)
+
+                if lag_secs > self._slow_callback_secs:
+                    self._report_slow_callback(lag_secs)
+
+        except asyncio.CancelledError:
+            self._stop()
+            self._logger.warning(f'{self.name} Stopped [Slow Callbacks: {self.slow_callbacks_amount}]'
+                                 f'[Max Lag: {self.max_lag_secs * 1000:.0f}ms]')
@@ -1,8 +1,14 @@
 import asyncio
+import importlib
 
+from concurrent.futures import ThreadPoolExecutor
 from logging import Logger
+from typing import Callable, List, Optional, Union
 
-from . import AioRmqConsumer, AsyncServer, AsyncServerHandler, ClientsController, ClientsSender, Utils
+from . import AsyncServer, AsyncServerHandler, ClientsController, ClientsSender, Utils
+from .LoopProfiler import LoopProfiler
+from .Metrics import Metrics
+from .Transport import Transport
 
 
 class MainServerLoop:
@@ -10,11 +16,30 @@ class MainServerLoop:
     def __init__(self, name: str,
                  async_server: AsyncServer,
                  async_server_handler: AsyncServerHandler,
-                 aio_rmq_consumer: AioRmqConsumer,
+                 aio_rmq_consumer: Union[Transport, List[Transport]],
                  clients_controller: ClientsController,
                  clients_sender: ClientsSender,
                  logger: Logger,
-                 exception_queue: asyncio.Queue):
+                 exception_queue: asyncio.Queue,
+                 metrics: Optional[Metrics] = None,
+                 profiler: Optional[LoopProfiler] = None,
+                 loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = None,
+                 use_uvloop: bool = False,
+                 executor_workers: Optional[int] = None,
+                 debug: Optional[bool] = None,
+                 slow_callback_duration_secs: float = 0.1):
+        """
+        :param aio_rmq_consumer: consumer or list of consumers (e.g. of different exchanges) or other transports
+        putting messages to the same received messages queue
+        :param profiler: reports callbacks blocking the loop and takes sampling profiles on demand
+        :param loop_factory: creates the event loop the server runs in, asyncio's default loop if None
+        :param use_uvloop: runs in uvloop's loop ("pip install aio-rmq-wss-proxy[uvloop]") if loop_factory isn't set,
+        asyncio's loop is used if uvloop isn't installed
+        :param executor_workers: threads of loop's default executor (auth checks, traffic recording and replay),
+        asyncio's default amount if None
+        :param debug: asyncio debug mode (None keeps PYTHONASYNCIODEBUG's choice),
+        asyncio logs callbacks slower than slow_callback_duration_secs in it
+        """
         self._name: str = Utils.format_name(name)
 
         self._logger: Logger = logger
@@ -22,34 +47,127 @@ class MainServerLoop:
 
         self._async_server: AsyncServer = async_server
         self._async_server_handler: AsyncServer = async_server_handler
-        self._aio_rmq_consumer: AioRmqConsumer = aio_rmq_consumer
+        self._aio_rmq_consumers: List[Transport] = aio_rmq_consumer if isinstance(aio_rmq_consumer, list) \
+            else [aio_rmq_consumer]
         self._clients_controller: ClientsController = clients_controller
         self._clients_sender: ClientsSender = clients_sender
 
-        self._loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+        self._metrics: Optional[Metrics] = metrics
+        self._loop_lag_interval_secs = 0.5
+        self._profiler: Optional[LoopProfiler] = profiler
 
-        self._main_task: asyncio.Task = self._loop.create_task(self.main(), name='Main-Task')
+        if loop_factory is None and use_uvloop:
+            loop_factory = MainServerLoop.get_uvloop_factory()
 
-        self._tasks = [
-            self._loop.create_task(self._async_server.run(), name='Async-Server-Task'),
-            self._loop.create_task(self._clients_controller.check_clients(), name='Check-Clients-Task'),
-            self._loop.create_task(self._aio_rmq_consumer.consume(), name='Transport-Consume-Task'),
-            self._loop.create_task(self._clients_sender.queue_handler(), name='Clients-Sender-Task'),
-            self._loop.create_task(self.exception_analysis(), name='Exc-Analysis-Task')
-        ]
+            if loop_factory is None:
+                self._logger.error(f'{self.name} uvloop is not Installed, asyncio Loop is Used')
+
+        self._loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = loop_factory
+        self._executor_workers: Optional[int] = executor_workers
+        self._debug: Optional[bool] = debug
+        self._slow_callback_duration_secs: float = slow_callback_duration_secs
+
+        # loop is created by the runner on the first run, asyncio.Runner is missing before Python 3.11.
+        # Services create asyncio queues, events and semaphores before the loop exists, which needs Python 3.10+:
+        # they were bound to the current loop when created before it
+        self._runner: Optional['asyncio.Runner'] = asyncio.Runner(debug=debug, loop_factory=loop_factory) \
+            if hasattr(asyncio, 'Runner') else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._main_task: Optional[asyncio.Task] = None
+        self._tasks: List[asyncio.Task] = []
 
     @property
     def name(self) -> str:
         return self._name
 
+    @staticmethod
+    def get_uvloop_factory() -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+        """
+        :return: uvloop's loop factory, None if uvloop isn't installed
+        """
+        try:
+            return importlib.import_module('uvloop').new_event_loop
+        except ImportError:
+            return None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+
+        if self._runner is not None:
+            self._loop = self._runner.get_loop()
+        else:
+            self._loop = self._loop_factory() if self._loop_factory else asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+
+            if self._debug is not None:
+                self._loop.set_debug(self._debug)
+
+        self._loop.slow_callback_duration = self._slow_callback_duration_secs
+
+        if self._executor_workers:
+            self._loop.set_default_executor(ThreadPoolExecutor(max_workers=self._executor_workers,
+                                                               thread_name_prefix='Loop-Executor'))
+
+        self._logger.warning(f'{self.name} Loop Created [{type(self._loop).__module__}.{type(self._loop).__name__}]')
+
+        return self._loop
+
+    def _create_tasks(self) -> List[asyncio.Task]:
+        loop = asyncio.get_running_loop()
+
+        tasks = [
+            loop.create_task(self._async_server.run(), name='Async-Server-Task'),
+            loop.create_task(self._clients_controller.check_clients(), name='Check-Clients-Task'),
+            loop.create_task(self._clients_sender.queue_handler(), name='Clients-Sender-Task'),
+            loop.create_task(self.exception_analysis(), name='Exc-Analysis-Task')
+        ]
+
+        for consumer_num, aio_rmq_consumer in enumerate(self._aio_rmq_consumers):
+            tasks.append(loop.create_task(aio_rmq_consumer.consume(), name=f'Transport-Consume-Task-{consumer_num}'))
+
+        if self._metrics:
+            tasks.append(loop.create_task(self.measure_loop_lag(), name='Loop-Lag-Task'))
+
+        if self._profiler:
+            tasks.append(loop.create_task(self._profiler.run(), name='Loop-Profiler-Task'))
+
+        return tasks
+
     def run(self):
-        self._loop.run_until_complete(self._main_task)
+        """
+        Runs the server until it's cancelled or stopped by an error. After KeyboardInterrupt call cancel()
+        and run() again to shut down gracefully
+        """
+        loop = self._get_loop()
+
+        if self._main_task is None:
+            self._main_task = loop.create_task(self.main(), name='Main-Task')
+
+        loop.run_until_complete(self._main_task)
 
     def stop(self):
-        self._loop.close()
+        """
+        Closes the loop: cancels the tasks left, shuts down async generators and the default executor
+        """
+        if self._runner is not None:
+            self._runner.close()
+
+        elif self._loop is not None:
+            try:
+                self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+
+                if hasattr(self._loop, 'shutdown_default_executor'):
+                    self._loop.run_until_complete(self._loop.shutdown_default_executor())
+
+            finally:
+                asyncio.set_event_loop(None)
+                self._loop.close()
 
     def cancel(self):
-        self._main_task.cancel()
+        if self._main_task is not None:
+            self._main_task.cancel()
 
     async def exception_analysis(self):
         exc_analysis_name = Utils.format_name('Exception Analysis')
@@ -78,6 +196,20 @@ class MainServerLoop:
         finally:
             self._logger.warning(f'{exc_analysis_name} Stopped')
 
+    async def measure_loop_lag(self):
+        """
+        Lag is how late the loop wakes up after a sleep, it grows when callbacks block the loop
+        """
+        try:
+            while True:
+                started = self._loop.time()
+                await asyncio.sleep(self._loop_lag_interval_secs)
+                lag = self._loop.time() - started - self._loop_lag_interval_secs
+                self._metrics.observe(Metrics.LOOP_LAG, max(lag, 0))
+
+        except asyncio.CancelledError:
+            return
+
     async def _cancel_tasks(self):
         self._async_server.stop()
 
@@ -89,6 +221,8 @@ class MainServerLoop:
     async def main(self):
         self._logger.warning(f'{self.name} Started')
 
+        self._tasks = self._create_tasks()
+
         try:
             await asyncio.wait(self._tasks)
 
@@ -0,0 +1,4 @@
+class MessagesBatch(list):
+    """
+    Messages received from RMQ in batch mode and handed to ClientsSender at once
+    """
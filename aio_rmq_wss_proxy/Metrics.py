@@ -0,0 +1,127 @@
+import bisect
+
+from typing import Callable, Dict, Optional, Tuple, Union
+
+
+class Metrics:
+    """
+
+    Counters, gauges and histograms of the proxy rendered in Prometheus text format.
+    Updating a metric is just an addition, gauges are evaluated by callbacks only when metrics are rendered
+
+    """
+    COUNTER = 'counter'
+    GAUGE = 'gauge'
+    HISTOGRAM = 'histogram'
+
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    RMQ_RECEIVED = 'rmq_messages_received_total'
+    RMQ_REJECTED = 'rmq_messages_rejected_total'
+    RECEIVED_QUEUE_DEPTH = 'received_messages_queue_depth'
+    RECEIVED_QUEUE_OVERLOADED = 'received_messages_queue_overloaded'
+    RECEIVED_QUEUE_OVERLOADS = 'received_messages_queue_overloads_total'
+    SENDER_SHARDS_QUEUES_DEPTH = 'sender_shard_queue_depth'
+    FANOUT_LATENCY = 'fanout_latency_seconds'
+    MESSAGES_SENT = 'messages_sent_total'
+    SEND_ERRORS = 'send_errors_total'
+    CLIENTS_CONNECTED = 'clients_connected'
+    CLIENTS_DISCONNECTED = 'clients_disconnected_total'
+    CLIENTS_COMMANDS = 'clients_commands_total'
+    ROOM_SUBSCRIBERS = 'room_subscribers'
+    OUTBOUND_QUEUES_DEPTH = 'outbound_queues_depth'
+    SNAPSHOTS_BYTES = 'rooms_snapshots_bytes'
+    LOOP_LAG = 'event_loop_lag_seconds'
+    SLOW_CALLBACKS = 'event_loop_slow_callbacks_total'
+    AUTH_CACHE_HITS = 'auth_cache_hits_total'
+    AUTH_CACHE_MISSES = 'auth_cache_misses_total'
+    AUTH_CACHE_SIZE = 'auth_cache_size'
+
+    def __init__(self, prefix: str = 'aio_rmq_wss_proxy'):
+        self._prefix = prefix
+
+        # name -> (type, help, label name)
+        self._descriptions: Dict[str, Tuple[str, str, Optional[str]]] = {}
+
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Callable[[], Union[float, Dict[str, float]]]] = {}
+        # name -> (buckets, buckets counts, [sum, count])
+        self._histograms: Dict[str, Tuple[Tuple[float, ...], list, list]] = {}
+
+        self.add_counter(Metrics.RMQ_RECEIVED, 'Messages received from RMQ or other transports')
+        self.add_counter(Metrics.RMQ_REJECTED, 'Messages rejected because of errors')
+        self.add_histogram(Metrics.FANOUT_LATENCY, 'Time from RMQ receive to the last websocket send',
+                           Metrics.LATENCY_BUCKETS)
+        self.add_counter(Metrics.MESSAGES_SENT, 'Messages sent or enqueued to websocket clients')
+        self.add_counter(Metrics.SEND_ERRORS, 'Failed sends: timeouts, closed connections, outbound queues overflows')
+        self.add_counter(Metrics.CLIENTS_DISCONNECTED, 'Disconnected clients')
+        self.add_counter(Metrics.CLIENTS_COMMANDS, 'Messages received from websocket clients')
+        self.add_histogram(Metrics.LOOP_LAG, 'Event loop lag', Metrics.LATENCY_BUCKETS)
+
+    def add_counter(self, name: str, description: str):
+        self._descriptions[name] = (Metrics.COUNTER, description, None)
+        self._counters[name] = 0
+
+    def add_gauge(self, name: str, description: str,
+                  callback: Callable[[], Union[float, Dict[str, float]]],
+                  label: Optional[str] = None):
+        """
+        :param callback: returns current value, or values by label values if label is set
+        """
+        self._descriptions[name] = (Metrics.GAUGE, description, label)
+        self._gauges[name] = callback
+
+    def add_histogram(self, name: str, description: str, buckets: Tuple[float, ...]):
+        self._descriptions[name] = (Metrics.HISTOGRAM, description, None)
+        self._histograms[name] = (tuple(buckets), [0] * (len(buckets) + 1), [0.0, 0])
+
+    def inc(self, name: str, value: float = 1):
+        self._counters[name] += value
+
+    def observe(self, name: str, value: float):
+        buckets, buckets_counts, total = self._histograms[name]
+        buckets_counts[bisect.bisect_left(buckets, value)] += 1
+        total[0] += value
+        total[1] += 1
+
+    def get_counter(self, name: str) -> float:
+        return self._counters[name]
+
+    def render(self) -> str:
+        lines = []
+
+        for name, (metric_type, description, label) in self._descriptions.items():
+            full_name = f'{self._prefix}_{name}'
+
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} {metric_type}')
+
+            if metric_type == Metrics.COUNTER:
+                lines.append(f'{full_name} {self._counters[name]}')
+
+            elif metric_type == Metrics.GAUGE:
+                value = self._gauges[name]()
+
+                if label is None:
+                    lines.append(f'{full_name} {value}')
+                else:
+                    lines.extend(f'{full_name}{{{label}="{self._escape(label_value)}"}} {label_metric}'
+                                 for label_value, label_metric in value.items())
+
+            else:
+                buckets, buckets_counts, (total_sum, total_count) = self._histograms[name]
+                cumulative = 0
+
+                for bucket, bucket_count in zip(buckets, buckets_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{full_name}_bucket{{le="{bucket}"}} {cumulative}')
+
+                lines.append(f'{full_name}_bucket{{le="+Inf"}} {total_count}')
+                lines.append(f'{full_name}_sum {total_sum}')
+                lines.append(f'{full_name}_count {total_count}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _escape(label_value) -> str:
+        return str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,81 @@
+import asyncio
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from .OverflowPolicy import OverflowPolicy
+
+
+class OutboundQueue:
+    """
+    Bounded queue of messages waiting to be written to one client
+    """
+    _SEQ_MARK = object()
+
+    def __init__(self, max_size: int, policy: str = OverflowPolicy.DROP_OLDEST):
+        if max_size <= 0:
+            raise ValueError(f'Outbound queue size must be positive: {max_size}')
+
+        if policy not in OverflowPolicy.ALL:
+            raise ValueError(f'Unknown overflow policy: {policy}')
+
+        self._max_size = max_size
+        self._policy = policy
+
+        # key -> message, messages without conflation key get a unique sequence key
+        self._messages = OrderedDict()
+        self._seq = 0
+
+        self._not_empty = asyncio.Event()
+
+        self.dropped_amount = 0
+        self.conflated_amount = 0
+        self.max_depth = 0
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def put(self, message: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        :return: False if the queue overflowed and DISCONNECT policy says the client has to be dropped
+        """
+        if key is not None and self._policy == OverflowPolicy.CONFLATE_BY_KEY and key in self._messages:
+            self._messages[key] = message
+            self.conflated_amount += 1
+            return True
+
+        if len(self._messages) >= self._max_size:
+            if self._policy == OverflowPolicy.DISCONNECT:
+                return False
+
+            self.dropped_amount += 1
+
+            if self._policy == OverflowPolicy.DROP_NEWEST:
+                return True
+
+            self._messages.popitem(last=False)
+
+        if key is None or self._policy != OverflowPolicy.CONFLATE_BY_KEY:
+            self._seq += 1
+            key = (self._SEQ_MARK, self._seq)
+
+        self._messages[key] = message
+        self.max_depth = max(self.max_depth, len(self._messages))
+        self._not_empty.set()
+
+        return True
+
+    async def get(self) -> Any:
+        while not self._messages:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        _, message = self._messages.popitem(last=False)
+        return message
+
+    def clear(self):
+        self._messages.clear()
@@ -0,0 +1,11 @@
+class OverflowPolicy:
+    """
+    What to do with a new message when client's outbound queue is full
+    """
+    DROP_OLDEST = 'drop oldest'
+    DROP_NEWEST = 'drop newest'
+    # pending message with the same key is replaced by the new one, without a key it works like DROP_OLDEST
+    CONFLATE_BY_KEY = 'conflate by key'
+    DISCONNECT = 'disconnect'
+
+    ALL = (DROP_OLDEST, DROP_NEWEST, CONFLATE_BY_KEY, DISCONNECT)
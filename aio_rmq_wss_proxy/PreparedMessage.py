@@ -0,0 +1,87 @@
+from typing import Any, Dict, Optional, Union
+
+from websockets.frames import Frame, Opcode, prepare_data
+
+
+class PreparedMessage:
+    """
+    Message which is encoded and framed only once and then written as is to every receiver's transport
+    """
+
+    def __init__(self, message: Union[str, bytes], opcode: Optional[Opcode] = None, source: Any = None):
+        """
+        :param source: object the message was encoded from, lets encode it in other wire formats without decoding
+        """
+        if opcode is None:
+            opcode, data = prepare_data(message)
+        else:
+            data = message.encode('utf-8') if isinstance(message, str) else bytes(message)
+
+        self._opcode = opcode
+        self._data = data
+
+        # server to client frames are never masked, so the same bytes fit any connection without extensions
+        self._frame = Frame(Opcode(opcode), data).serialize(mask=False)
+
+        # (compression, frame) of the latest shared compression
+        self._compressed_frame = None
+
+        self._source = source
+        # wire format -> the message encoded in the format
+        self._formats: Optional[Dict[str, PreparedMessage]] = None
+
+    @property
+    def opcode(self) -> int:
+        return self._opcode
+
+    @property
+    def data(self) -> bytes:
+        return self._data
+
+    @property
+    def frame(self) -> bytes:
+        return self._frame
+
+    @property
+    def source(self) -> Any:
+        return self._source
+
+    def in_format(self, codec) -> 'PreparedMessage':
+        """
+        :param codec: WireCodec of the receiver
+        :return: the message encoded in codec's format once for all the receivers of the format
+        """
+        if self._formats is None:
+            self._formats = {}
+
+        message = self._formats.get(codec.format)
+
+        if message is None:
+            message = self._formats[codec.format] = codec.transcode(self)
+
+        return message
+
+    def get_compressed_frame(self, compression) -> bytes:
+        """
+        :param compression: DeflateCompression in shared mode
+        :return: frame compressed once for all the connections sharing compression, not compressed below threshold
+        """
+        if len(self._data) < compression.threshold:
+            return self._frame
+
+        if self._compressed_frame is None or self._compressed_frame[0] is not compression:
+            frame = bytearray(Frame(Opcode(self._opcode), compression.compress(self._data)).serialize(mask=False))
+            # rsv1 bit marks compressed message, Frame doesn't serialize it without the extension
+            frame[0] |= 0b01000000
+            self._compressed_frame = (compression, bytes(frame))
+
+        return self._compressed_frame[1]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __str__(self) -> str:
+        if self._opcode == Opcode.TEXT:
+            return self._data.decode('utf-8')
+
+        return str(self._data)
@@ -0,0 +1,13 @@
+class RawMessage:
+    """
+    RMQ message forwarded to room's subscribers as is, without decoding and encoding again
+    """
+    __slots__ = ('room', 'body', 'binary')
+
+    def __init__(self, room: str, body: bytes, binary: bool = False):
+        self.room = room
+        self.body = body
+        self.binary = binary
+
+    def __repr__(self) -> str:
+        return f'RawMessage(room={self.room!r}, body={self.body!r})'
@@ -0,0 +1,23 @@
+import time
+
+from typing import Any, Awaitable, Callable, Optional
+
+
+class ReceivedMessage:
+    """
+    Envelope of a message put to received messages queue by consumer, keeps the moment it was received
+    """
+    __slots__ = ('message', 'received_at', 'on_done')
+
+    def __init__(self, message: Any, on_done: Optional[Callable[[], Awaitable[None]]] = None):
+        """
+        :param on_done: called once the message is sent to all the receivers (e.g. acks it in RMQ)
+        """
+        self.message = message
+        self.received_at = time.monotonic()
+        self.on_done = on_done
+
+    async def done(self):
+        if self.on_done is not None:
+            on_done, self.on_done = self.on_done, None
+            await on_done()
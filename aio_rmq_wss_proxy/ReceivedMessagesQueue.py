@@ -0,0 +1,75 @@
+import asyncio
+
+from logging import Logger
+from typing import Any, Optional
+
+from . import Utils
+from .Metrics import Metrics
+
+
+class ReceivedMessagesQueue(asyncio.Queue):
+    """
+
+    Bounded received messages queue. Consumers wait while it's full, so with limited prefetch_count
+    RMQ stops delivering messages when clients sender is behind and memory stays flat instead of growing.
+    Depth reaching high watermark and falling back to low watermark is logged and exposed as metrics
+
+    """
+
+    def __init__(self, maxsize: int,
+                 logger: Logger,
+                 high_watermark: float = 0.8,
+                 low_watermark: float = 0.5,
+                 metrics: Optional[Metrics] = None,
+                 name: str = 'Received Queue'):
+        """
+        :param high_watermark: part of maxsize, the queue is overloaded since its depth reaches it
+        :param low_watermark: part of maxsize, the queue isn't overloaded since its depth falls to it
+        """
+        if maxsize <= 0:
+            raise ValueError(f'Received messages queue size must be positive: {maxsize}')
+
+        if not 0 <= low_watermark < high_watermark <= 1:
+            raise ValueError(f'Watermarks must be 0 <= low < high <= 1: {low_watermark}, {high_watermark}')
+
+        super(ReceivedMessagesQueue, self).__init__(maxsize)
+
+        self._name = Utils.format_name(name)
+        self._logger = logger
+        self._metrics = metrics
+
+        self._high_depth = max(int(maxsize * high_watermark), 1)
+        self._low_depth = int(maxsize * low_watermark)
+
+        self.overloaded = False
+        self.overloads_amount = 0
+
+        if metrics:
+            metrics.add_gauge(Metrics.RECEIVED_QUEUE_OVERLOADED, 'Received messages queue is above high watermark',
+                              lambda: int(self.overloaded))
+            metrics.add_counter(Metrics.RECEIVED_QUEUE_OVERLOADS, 'Received messages queue reached high watermark')
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def put_nowait(self, item: Any):
+        super(ReceivedMessagesQueue, self).put_nowait(item)
+
+        if not self.overloaded and self.qsize() >= self._high_depth:
+            self.overloaded = True
+            self.overloads_amount += 1
+
+            if self._metrics:
+                self._metrics.inc(Metrics.RECEIVED_QUEUE_OVERLOADS)
+
+            self._logger.warning(f'{self.name} High Watermark Reached [Depth: {self.qsize()}/{self.maxsize}]')
+
+    def get_nowait(self) -> Any:
+        item = super(ReceivedMessagesQueue, self).get_nowait()
+
+        if self.overloaded and self.qsize() <= self._low_depth:
+            self.overloaded = False
+            self._logger.warning(f'{self.name} Low Watermark Reached [Depth: {self.qsize()}/{self.maxsize}]')
+
+        return item
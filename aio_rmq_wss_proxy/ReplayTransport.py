@@ -0,0 +1,163 @@
+import asyncio
+import struct
+import time
+
+from logging import Logger
+from typing import BinaryIO, List, Optional, Tuple
+
+from .JsonCodec import JsonCodec
+from .Metrics import Metrics
+from .Transport import Transport
+
+
+class ReplayTransport(Transport):
+    """
+
+    Transport streaming recorded messages (see TrafficRecorder) from a file at their original timing scaled by speed,
+    at the given rate or as fast as possible, drives the whole fan-out path without broker in profiling and CI.
+    Every record is a header: record time (big endian double), room length and body length
+    (big endian unsigned short and int), followed by utf-8 room (may be empty) and body, see pack().
+    The file is read in executor by chunks of records
+
+    """
+    RECORD_HEADER = struct.Struct('>dHI')
+    READ_CHUNK_RECORDS = 1000
+
+    def __init__(self, path: str,
+                 received_messages_queue: asyncio.Queue,
+                 logger: Logger,
+                 exception_queue: asyncio.Queue,
+                 rate: float = 0,
+                 loops: int = 1,
+                 speed: float = 0,
+                 max_pause_secs: float = 5,
+                 codec: Optional[JsonCodec] = None,
+                 passthrough: bool = False,
+                 passthrough_binary: bool = False,
+                 room_field: Optional[str] = None,
+                 metrics: Optional[Metrics] = None,
+                 name: str = 'Replay Transport'):
+        """
+        :param rate: messages per second if speed is 0, 0 means as fast as clients sender takes them
+        :param loops: times the file is replayed
+        :param speed: replays records with the recorded pauses between them divided by speed:
+        1 is the original timing, 2 is twice as fast, 0 ignores recorded timing
+        :param max_pause_secs: longer recorded pauses (e.g. between recording sessions) are shortened to it
+        :param room_field: decoded message gets record's room as this field if the field isn't set
+        """
+        super(ReplayTransport, self).__init__(name, received_messages_queue, logger, exception_queue,
+                                              codec=codec,
+                                              passthrough=passthrough,
+                                              passthrough_binary=passthrough_binary,
+                                              room_field=room_field,
+                                              metrics=metrics)
+
+        self._path = path
+        self._rate = rate
+        self._loops = loops
+        self._speed = speed
+        self._max_pause_secs = max_pause_secs
+
+        self.replayed_amount = 0
+        self.replay_secs = 0.0
+        # set when all the messages are replayed and handled by clients sender
+        self.finished = asyncio.Event()
+
+    @staticmethod
+    def pack(body: bytes, room: Optional[str] = None, recorded_at: float = 0) -> bytes:
+        """
+        :param recorded_at: record time, seconds
+        :return: record to write to replay file
+        """
+        room_bytes = room.encode('utf-8') if room else b''
+
+        return ReplayTransport.RECORD_HEADER.pack(recorded_at, len(room_bytes), len(body)) + room_bytes + body
+
+    @staticmethod
+    def read_records(file: BinaryIO, amount: int) -> List[Tuple[float, Optional[str], bytes]]:
+        """
+        :return: up to amount of (record time, room, body), empty list at the end of file
+        """
+        records = []
+
+        while len(records) < amount:
+            header = file.read(ReplayTransport.RECORD_HEADER.size)
+
+            if len(header) < ReplayTransport.RECORD_HEADER.size:
+                break
+
+            recorded_at, room_length, body_length = ReplayTransport.RECORD_HEADER.unpack(header)
+            room = file.read(room_length).decode('utf-8') if room_length else None
+            body = file.read(body_length)
+
+            if len(body) < body_length:
+                raise ValueError(f'Replay file is truncated: {file.name}')
+
+            records.append((recorded_at, room, body))
+
+        return records
+
+    async def _replay_file(self, started: float):
+        loop = asyncio.get_running_loop()
+
+        # recorded timing is replayed from the start of every loop
+        loop_started = time.monotonic()
+        timeline_secs = 0.0
+        previous_recorded_at = None
+
+        with open(self._path, 'rb') as file:
+            while True:
+                records = await loop.run_in_executor(None, self.read_records, file, self.READ_CHUNK_RECORDS)
+
+                if not records:
+                    return
+
+                for recorded_at, room, body in records:
+                    delay_secs = 0
+
+                    if self._speed:
+                        if previous_recorded_at is not None:
+                            pause_secs = max(recorded_at - previous_recorded_at, 0) / self._speed
+                            timeline_secs += min(pause_secs, self._max_pause_secs)
+
+                        previous_recorded_at = recorded_at
+                        delay_secs = loop_started + timeline_secs - time.monotonic()
+
+                    elif self._rate:
+                        delay_secs = started + self.replayed_amount / self._rate - time.monotonic()
+
+                    if delay_secs > 0:
+                        await asyncio.sleep(delay_secs)
+
+                    await self._process_body(body, room)
+                    self.replayed_amount += 1
+
+                # unbounded queue never waits, the loop gets a chance to send
+                await asyncio.sleep(0)
+
+    async def consume(self):
+        try:
+            pace = f'Speed: {self._speed}x' if self._speed else f'Rate: {self._rate or "max"}'
+            self._logger.warning(f'{self.name} Started [PATH: {self._path}][{pace}]')
+
+            started = time.monotonic()
+
+            for _ in range(self._loops):
+                await self._replay_file(started)
+
+            await self._received_messages_queue.join()
+
+            self.replay_secs = time.monotonic() - started
+            self.finished.set()
+
+            self._logger.warning(f'{self.name} Replayed {self.replayed_amount} messages '
+                                 f'in {self.replay_secs:.2f}s')
+
+            await asyncio.Future()
+
+        except asyncio.CancelledError:
+            self._logger.warning(f'{self.name} Stopped')
+
+        except Exception as ex:
+            self._logger.error(f'{self.name} Stopped because of an Error')
+            await self._exception_queue.put((self.name, 'Replaying', ex))
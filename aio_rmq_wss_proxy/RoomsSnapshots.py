@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+from .PreparedMessage import PreparedMessage
+
+
+class RoomsSnapshots:
+    """
+
+    Last updates of rooms sent to clients right after they subscribe.
+    Every room keeps the latest update per key (e.g. symbol) and the last updates without key, room_size at most.
+    Rooms are evicted in least recently used order when there are more than max_rooms or their updates
+    take more than max_bytes
+
+    """
+    _SEQ_MARK = object()
+
+    def __init__(self, room_size: int = 1, max_rooms: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        if room_size <= 0:
+            raise ValueError(f'Room snapshot size must be positive: {room_size}')
+
+        self._room_size = room_size
+        self._max_rooms = max_rooms
+        self._max_bytes = max_bytes
+
+        # room -> key -> prepared update, both in least recently used order
+        self._rooms: OrderedDict[str, OrderedDict] = OrderedDict()
+        self._seq = 0
+        self._bytes_amount = 0
+
+        self.evicted_rooms_amount = 0
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    @property
+    def bytes_amount(self) -> int:
+        return self._bytes_amount
+
+    def save(self, room: str, message: PreparedMessage, key: Optional[Hashable] = None):
+        room_updates = self._rooms.get(room)
+
+        if room_updates is None:
+            room_updates = self._rooms[room] = OrderedDict()
+        else:
+            self._rooms.move_to_end(room)
+
+        if key is None:
+            self._seq += 1
+            key = (self._SEQ_MARK, self._seq)
+
+        previous_message = room_updates.pop(key, None)
+
+        if previous_message is not None:
+            self._bytes_amount -= len(previous_message)
+
+        room_updates[key] = message
+        self._bytes_amount += len(message)
+
+        while len(room_updates) > self._room_size:
+            self._bytes_amount -= len(room_updates.popitem(last=False)[1])
+
+        self._evict()
+
+    def _evict(self):
+        while len(self._rooms) > self._max_rooms or (self._bytes_amount > self._max_bytes and len(self._rooms) > 1):
+            _, room_updates = self._rooms.popitem(last=False)
+            self._bytes_amount -= sum(len(message) for message in room_updates.values())
+            self.evicted_rooms_amount += 1
+
+        if self._bytes_amount <= self._max_bytes:
+            return
+
+        # the only room left is too big, its oldest updates are dropped
+        for room_updates in self._rooms.values():
+            while self._bytes_amount > self._max_bytes and room_updates:
+                self._bytes_amount -= len(room_updates.popitem(last=False)[1])
+
+    def get(self, room: str) -> List[Tuple[Optional[Hashable], PreparedMessage]]:
+        """
+        :return: room's updates as (key, message) from the oldest to the latest, keys of updates without key are None
+        """
+        room_updates = self._rooms.get(room)
+
+        if room_updates is None:
+            return []
+
+        self._rooms.move_to_end(room)
+
+        return [(None if isinstance(key, tuple) and key and key[0] is self._SEQ_MARK else key, message)
+                for key, message in room_updates.items()]
+
+    def remove(self, room: str):
+        room_updates = self._rooms.pop(room, None)
+
+        if room_updates is not None:
+            self._bytes_amount -= sum(len(message) for message in room_updates.values())
@@ -0,0 +1,105 @@
+from typing import Dict, Optional
+
+
+class _TrieNode:
+    __slots__ = ('children', 'clients')
+
+    def __init__(self):
+        self.children: Dict[str, _TrieNode] = {}
+        # client id -> websocket of clients subscribed to the pattern ending at the node
+        self.clients: Dict[str, object] = {}
+
+
+class RoomsTrie:
+    """
+
+    Index of wildcard subscriptions. Room names and patterns are split by "." into words like RMQ topic routing keys:
+    "*" matches exactly one word and "#" matches zero or more words ("trades.BTC.*", "trades.#").
+    Looking up a room walks its words, so it doesn't depend on the amount of patterns
+
+    """
+    SEPARATOR = '.'
+    ONE_WORD = '*'
+    ANY_WORDS = '#'
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._patterns_amount = 0
+
+    def __len__(self) -> int:
+        return self._patterns_amount
+
+    @staticmethod
+    def is_pattern(room_name: str) -> bool:
+        return any(word in (RoomsTrie.ONE_WORD, RoomsTrie.ANY_WORDS) for word in room_name.split(RoomsTrie.SEPARATOR))
+
+    def add(self, pattern: str, client_id: str, websocket):
+        node = self._root
+
+        for word in pattern.split(self.SEPARATOR):
+            node = node.children.setdefault(word, _TrieNode())
+
+        if not node.clients:
+            self._patterns_amount += 1
+
+        node.clients[client_id] = websocket
+
+    def remove(self, pattern: str, client_id: str):
+        words = pattern.split(self.SEPARATOR)
+        path = [self._root]
+
+        for word in words:
+            node = path[-1].children.get(word)
+
+            if node is None:
+                return
+
+            path.append(node)
+
+        if path[-1].clients.pop(client_id, None) is None:
+            return
+
+        if not path[-1].clients:
+            self._patterns_amount -= 1
+
+        # frees the nodes left without patterns
+        for word_num in range(len(words) - 1, -1, -1):
+            node = path[word_num + 1]
+
+            if node.clients or node.children:
+                break
+
+            del path[word_num].children[words[word_num]]
+
+    def match(self, room_name: str, receivers: Optional[Dict[str, object]] = None) -> Dict[str, object]:
+        """
+        :param receivers: dict to add the matched clients to
+        :return: client id -> websocket of clients with patterns matching the room
+        """
+        receivers = {} if receivers is None else receivers
+
+        if self._patterns_amount:
+            self._match(self._root, room_name.split(self.SEPARATOR), 0, receivers)
+
+        return receivers
+
+    def _match(self, node: _TrieNode, words: list, word_num: int, receivers: Dict[str, object]):
+        any_words_node = node.children.get(self.ANY_WORDS)
+
+        if any_words_node is not None:
+            for next_word_num in range(word_num, len(words) + 1):
+                self._match(any_words_node, words, next_word_num, receivers)
+
+        if word_num == len(words):
+            receivers.update(node.clients)
+            return
+
+        word_node = node.children.get(words[word_num])
+
+        if word_node is not None:
+            self._match(word_node, words, word_num + 1, receivers)
+
+        one_word_node = node.children.get(self.ONE_WORD)
+
+        if one_word_node is not None:
+            self._match(one_word_node, words, word_num + 1, receivers)
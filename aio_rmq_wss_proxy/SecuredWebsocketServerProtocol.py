@@ -1,10 +1,27 @@
+import asyncio
+import functools
+import hmac
 import http
+import inspect
 
 import urllib.parse as urllib
 
-from typing import Optional
+from concurrent.futures import Executor
+from typing import Any, Callable, Hashable, List, Optional, Union
 
+from .AuthCache import AuthCache
+from .DeflateCompression import DeflateCompression
+from .LoopProfiler import LoopProfiler
+from .Metrics import Metrics
+from .OutboundQueue import OutboundQueue
+from .OverflowPolicy import OverflowPolicy
+from .PreparedMessage import PreparedMessage
+from .WireCodec import WireCodec
+
+from websockets.connection import State
 from websockets.datastructures import Headers
+from websockets.exceptions import ConnectionClosed
+from websockets.frames import Opcode
 from websockets.legacy.server import HTTPResponse
 from websockets.server import WebSocketServerProtocol
 
@@ -15,10 +32,210 @@ class SecuredWebsocketServerProtocol(WebSocketServerProtocol):
     CHECK_DEVICE_METHOD = None
     FORWARDING_IS_ON = False
 
+    # check methods may be coroutine functions, sync ones are called in AUTH_EXECUTOR threads
+    # (loop's default executor if None) when AUTH_IN_EXECUTOR is on, so slow checks don't block the loop
+    AUTH_IN_EXECUTOR = False
+    AUTH_EXECUTOR: Optional[Executor] = None
+    # decisions of check methods cached by token
+    AUTH_CACHE: Optional[AuthCache] = None
+
+    # 0 means messages are written directly by the sender without per client queue and writer task
+    OUTBOUND_QUEUE_SIZE = 0
+    OUTBOUND_OVERFLOW_POLICY = OverflowPolicy.DROP_OLDEST
+    OUTBOUND_SEND_TIMEOUT_SECS = 5
+
+    # admin endpoints are served only to requests with "Authorization: Bearer <ADMIN_TOKEN>" header,
+    # none of them is served while ADMIN_TOKEN isn't set
+    ADMIN_TOKEN: Optional[str] = None
+
+    # metrics are served over plain HTTP GET on METRICS_PATH of the websocket port, it's an admin endpoint
+    METRICS: Optional[Metrics] = None
+    METRICS_PATH = '/metrics'
+
+    # GET on PROFILE_PATH starts sampling profile of PROFILER, it's an admin endpoint
+    PROFILER: Optional[LoopProfiler] = None
+    PROFILE_PATH = '/profile'
+
+    # formats client can choose with subprotocol or WIRE_FORMAT_PARAM query parameter (e.g. "/?format=msgpack"),
+    # their libraries must be installed (see WireCodec.is_available), JSON is used if client doesn't choose
+    WIRE_FORMATS = (WireCodec.JSON,)
+    WIRE_FORMAT_PARAM = 'format'
+
     def __init__(self, *args, **kwargs):
+        if not kwargs.get('subprotocols') and len(SecuredWebsocketServerProtocol.WIRE_FORMATS) > 1:
+            kwargs['subprotocols'] = list(SecuredWebsocketServerProtocol.WIRE_FORMATS)
+
         super().__init__(*args, **kwargs)
         self.user_id = None
         self.client_ip = None
+        self.wire_format = WireCodec.JSON
+
+        self._close_callbacks: List[Callable[[], None]] = []
+
+        self._outbound_queue: Optional[OutboundQueue] = None
+        self._outbound_writer_task: Optional[asyncio.Task] = None
+
+        # compression of frames written as is, when negotiated parameters let the connection share it
+        self._shared_compression: Optional[DeflateCompression] = None
+
+        if SecuredWebsocketServerProtocol.OUTBOUND_QUEUE_SIZE > 0:
+            self._outbound_queue = OutboundQueue(SecuredWebsocketServerProtocol.OUTBOUND_QUEUE_SIZE,
+                                                 SecuredWebsocketServerProtocol.OUTBOUND_OVERFLOW_POLICY)
+
+    @property
+    def has_outbound_queue(self) -> bool:
+        return self._outbound_queue is not None
+
+    @property
+    def outbound_queue_depth(self) -> int:
+        return len(self._outbound_queue) if self._outbound_queue is not None else 0
+
+    @property
+    def outbound_dropped_amount(self) -> int:
+        return self._outbound_queue.dropped_amount if self._outbound_queue is not None else 0
+
+    def add_close_callback(self, callback: Callable[[], None]):
+        """
+        Callback is called once as soon as the connection is lost
+        """
+        self._close_callbacks.append(callback)
+
+    def connection_open(self):
+        super(SecuredWebsocketServerProtocol, self).connection_open()
+
+        # subprotocol takes precedence over query parameter
+        if self.subprotocol in SecuredWebsocketServerProtocol.WIRE_FORMATS:
+            self.wire_format = self.subprotocol
+
+        if len(self.extensions) == 1:
+            compression = getattr(self.extensions[0], 'compression', None)
+
+            if compression is not None and compression.can_share(self.extensions[0]):
+                self._shared_compression = compression
+
+        if self._outbound_queue is not None:
+            self._outbound_writer_task = self.loop.create_task(self._outbound_writer())
+
+    def connection_lost(self, exc: Optional[Exception]):
+        super(SecuredWebsocketServerProtocol, self).connection_lost(exc)
+
+        if self._outbound_writer_task:
+            self._outbound_writer_task.cancel()
+
+        if self._outbound_queue is not None:
+            self._outbound_queue.clear()
+
+        close_callbacks, self._close_callbacks = self._close_callbacks, []
+
+        for callback in close_callbacks:
+            callback()
+
+    def enqueue_prepared(self, message: PreparedMessage, key: Optional[Hashable] = None) -> bool:
+        """
+        Puts message to client's outbound queue, it is written later by the client's writer task
+        :param message: prepared message
+        :param key: conflation key, pending message with the same key is replaced (CONFLATE_BY_KEY policy only)
+        :return: False if connection is closed or dropped because of queue overflow
+        """
+        if self.closed:
+            return False
+
+        if not self._outbound_queue.put(message, key):
+            self.fail_connection(1008, 'Outbound queue overflow')
+            return False
+
+        return True
+
+    async def _outbound_writer(self):
+        try:
+            while True:
+                message = await self._outbound_queue.get()
+                await asyncio.wait_for(self.send_prepared(message),
+                                       timeout=SecuredWebsocketServerProtocol.OUTBOUND_SEND_TIMEOUT_SECS)
+
+        except asyncio.TimeoutError:
+            self.fail_connection(1008, 'Send timeout')
+
+        except (ConnectionClosed, asyncio.CancelledError):
+            return
+
+    @staticmethod
+    def prepare_message(message: Union[str, bytes], opcode: Optional[Opcode] = None,
+                        source: Any = None) -> PreparedMessage:
+        return PreparedMessage(message, opcode, source)
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        # connection answered with HTTP response (metrics, failed auth) was never opened,
+        # it's closed by server on stop like the others
+        if not hasattr(self, 'transfer_data_task'):
+            return
+
+        await super(SecuredWebsocketServerProtocol, self).close(code, reason)
+
+    def write_prepared(self, message: PreparedMessage, key: Optional[Hashable] = None) -> bool:
+        """
+        Writes prepared message (or puts it to outbound queue) right away without waiting for transport to drain,
+        messages written one after another keep their order against concurrent sends
+        :return: False if connection isn't open or outbound queue overflowed with DISCONNECT policy
+        """
+        if self._outbound_queue is not None:
+            return self.enqueue_prepared(message, key)
+
+        if self.state is not State.OPEN or self._fragmented_message_waiter is not None:
+            return False
+
+        self._write_prepared_frame(message)
+
+        return True
+
+    def _write_prepared_frame(self, message: PreparedMessage):
+        if not self.extensions:
+            self.transport.write(message.frame)
+
+        elif self._shared_compression is not None:
+            self.transport.write(message.get_compressed_frame(self._shared_compression))
+
+        else:
+            self.write_frame_sync(True, message.opcode, message.data)
+
+    async def send_prepared(self, message: PreparedMessage):
+        """
+        Same as send() for a message prepared once for all receivers.
+        Prepared frame is written directly to transport unless connection negotiated extensions (like compression),
+        in this case frame is built for the connection from already encoded data
+        or compressed once for all the connections sharing compression (see DeflateCompression)
+        """
+        await self.ensure_open()
+
+        while self._fragmented_message_waiter is not None:
+            await asyncio.shield(self._fragmented_message_waiter)
+
+        self._write_prepared_frame(message)
+
+        await self.drain()
+
+    @staticmethod
+    async def _call_check_method(method: Callable, *args) -> Any:
+        if asyncio.iscoroutinefunction(method):
+            return await method(*args)
+
+        if SecuredWebsocketServerProtocol.AUTH_IN_EXECUTOR:
+            return await asyncio.get_running_loop().run_in_executor(SecuredWebsocketServerProtocol.AUTH_EXECUTOR,
+                                                                    functools.partial(method, *args))
+
+        result = method(*args)
+
+        return await result if inspect.isawaitable(result) else result
+
+    async def _check(self, method: Callable, cache_key: tuple, *args) -> Any:
+        """
+        Calls check method or takes its decision from AUTH_CACHE
+        """
+        if SecuredWebsocketServerProtocol.AUTH_CACHE is None:
+            return await self._call_check_method(method, *args)
+
+        return await SecuredWebsocketServerProtocol.AUTH_CACHE.get_or_check(
+            cache_key, functools.partial(self._call_check_method, method, *args))
 
     def get_auth_token(self, path: str, request_headers: Headers) -> Optional[str]:
         auth_token = request_headers.get("Authorization", None)
@@ -31,6 +248,11 @@ class SecuredWebsocketServerProtocol(WebSocketServerProtocol):
 
         return auth_token[0] if auth_token else None
 
+    def get_wire_format(self, path: str) -> Optional[str]:
+        wire_format = urllib.parse_qs(urllib.urlparse(path).query).get(SecuredWebsocketServerProtocol.WIRE_FORMAT_PARAM)
+
+        return wire_format[0] if wire_format else None
+
     def get_device_identifier(self, request_headers: Headers):
         return request_headers.get('Device-Identifier', None)
 
@@ -42,25 +264,70 @@ class SecuredWebsocketServerProtocol(WebSocketServerProtocol):
         else:
             return self.remote_address[0]
 
+    @staticmethod
+    def _check_admin_token(request_headers: Headers) -> bool:
+        expected = f'Bearer {SecuredWebsocketServerProtocol.ADMIN_TOKEN}'.encode('utf-8')
+
+        return hmac.compare_digest(request_headers.get('Authorization', '').encode('utf-8'), expected)
+
+    def _process_admin_request(self, request_path: str, request_headers: Headers) -> Optional[HTTPResponse]:
+        """
+        :return: response of admin endpoint, None if the path isn't served admin endpoint
+        """
+        if SecuredWebsocketServerProtocol.METRICS and request_path == SecuredWebsocketServerProtocol.METRICS_PATH:
+            if not self._check_admin_token(request_headers):
+                return http.HTTPStatus.UNAUTHORIZED, [], b"Invalid admin credentials\n"
+
+            return http.HTTPStatus.OK, [('Content-Type', 'text/plain; version=0.0.4')], \
+                SecuredWebsocketServerProtocol.METRICS.render().encode('utf-8')
+
+        if SecuredWebsocketServerProtocol.PROFILER and request_path == SecuredWebsocketServerProtocol.PROFILE_PATH:
+            if not self._check_admin_token(request_headers):
+                return http.HTTPStatus.UNAUTHORIZED, [], b"Invalid admin credentials\n"
+
+            if not SecuredWebsocketServerProtocol.PROFILER.start_sampling():
+                return http.HTTPStatus.CONFLICT, [], b"Profiling is in progress\n"
+
+            return http.HTTPStatus.ACCEPTED, [], b"Profiling started\n"
+
+        return None
+
     async def process_request(self, path: str, request_headers: Headers) -> Optional[HTTPResponse]:
+        if SecuredWebsocketServerProtocol.ADMIN_TOKEN:
+            admin_response = self._process_admin_request(urllib.urlparse(path).path, request_headers)
+
+            if admin_response:
+                return admin_response
+
         self.client_ip = self.get_ip_address(request_headers)
 
         if not self.client_ip:
             return http.HTTPStatus.BAD_REQUEST, [], b"Ip address header is missing\n"
 
+        wire_format = self.get_wire_format(path)
+
+        if wire_format:
+            if wire_format not in SecuredWebsocketServerProtocol.WIRE_FORMATS:
+                return http.HTTPStatus.BAD_REQUEST, [], b"Unsupported format\n"
+
+            self.wire_format = wire_format
+
         if SecuredWebsocketServerProtocol.CHECK_TOKEN_METHOD:
             auth_token = self.get_auth_token(path, request_headers)
 
             if not auth_token:
                 return http.HTTPStatus.UNAUTHORIZED, [], b"Missing credentials\n"
 
-            self.user_id = SecuredWebsocketServerProtocol.CHECK_TOKEN_METHOD(auth_token)
+            self.user_id = await self._check(SecuredWebsocketServerProtocol.CHECK_TOKEN_METHOD, ('token', auth_token),
+                                             auth_token)
 
             if not self.user_id:
                 return http.HTTPStatus.UNAUTHORIZED, [], b"Invalid credentials\n"
 
             if SecuredWebsocketServerProtocol.CHECK_IP_ADDRESS_METHOD:
-                success = SecuredWebsocketServerProtocol.CHECK_IP_ADDRESS_METHOD(auth_token, self.client_ip)
+                success = await self._check(SecuredWebsocketServerProtocol.CHECK_IP_ADDRESS_METHOD,
+                                            ('ip', auth_token, self.client_ip),
+                                            auth_token, self.client_ip)
 
                 if not success:
                     return http.HTTPStatus.UNAUTHORIZED, [], b'Current IP address is not allowed\n'
@@ -71,7 +338,9 @@ class SecuredWebsocketServerProtocol(WebSocketServerProtocol):
                 if not device_identifier:
                     return http.HTTPStatus.UNAUTHORIZED, [], b'Missing device identifier\n'
 
-                success = SecuredWebsocketServerProtocol.CHECK_DEVICE_METHOD(auth_token, device_identifier)
+                success = await self._check(SecuredWebsocketServerProtocol.CHECK_DEVICE_METHOD,
+                                            ('device', auth_token, device_identifier),
+                                            auth_token, device_identifier)
 
                 if not success:
                     return http.HTTPStatus.UNAUTHORIZED, [], b'Current device identifier is not allowed\n'
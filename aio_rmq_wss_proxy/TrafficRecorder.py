@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import time
+
+from logging import Logger
+from typing import BinaryIO, List, Optional
+
+from . import Utils
+from .ReplayTransport import ReplayTransport
+
+
+class TrafficRecorder:
+    """
+
+    Appends received bodies with their receive time and room (routing key) to a replay file for ReplayTransport.
+    Records are buffered and written by executor every flush_interval_secs, so recording never blocks the loop.
+    When writing is behind by more than max_pending_bytes, new records are dropped
+
+    """
+
+    def __init__(self, path: str,
+                 logger: Logger,
+                 flush_interval_secs: float = 0.5,
+                 max_pending_bytes: int = 16 * 1024 * 1024,
+                 name: str = 'Traffic Recorder'):
+        self._name = Utils.format_name(name)
+        self._logger = logger
+
+        self._path = path
+        self._flush_interval_secs = flush_interval_secs
+        self._max_pending_bytes = max_pending_bytes
+
+        self._file: Optional[BinaryIO] = None
+
+        self._pending: List[bytes] = []
+        # pending and being written
+        self._pending_bytes = 0
+
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_future: Optional[asyncio.Future] = None
+
+        self.recorded_amount = 0
+        self.dropped_amount = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def record(self, body: bytes, room: Optional[str] = None):
+        if self._pending_bytes + len(body) > self._max_pending_bytes:
+            self.dropped_amount += 1
+            return
+
+        record = ReplayTransport.pack(body, room, time.time())
+
+        self._pending.append(record)
+        self._pending_bytes += len(record)
+        self.recorded_amount += 1
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            self._file = open(self._path, 'ab')
+
+        self._file.write(data)
+        self._file.flush()
+
+    def _on_written(self, records_amount: int, data_size: int, write_future: asyncio.Future):
+        self._pending_bytes -= data_size
+
+        if not write_future.cancelled() and write_future.exception() is not None:
+            self.dropped_amount += records_amount
+            self._logger.error(f'{self.name} Writing {records_amount} Records Failed. '
+                               f'Reason: {write_future.exception()}')
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+
+        while self._pending:
+            records, self._pending = self._pending, []
+            data = b''.join(records)
+
+            self._write_future = loop.run_in_executor(None, self._write, data)
+            self._write_future.add_done_callback(functools.partial(self._on_written, len(records), len(data)))
+
+            # cancelled flush doesn't stop the write in progress, closing waits for it
+            await asyncio.wait([self._write_future])
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self._flush_interval_secs)
+            await self._flush()
+
+        except asyncio.CancelledError:
+            return
+
+        finally:
+            self._flush_task = None
+
+    async def close(self):
+        """
+        Writes the pending records and closes the file, recording can go on after it
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+        if self._write_future is not None and not self._write_future.done():
+            await asyncio.wait([self._write_future])
+
+        await self._flush()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+            self._logger.warning(f'{self.name} Closed [Recorded: {self.recorded_amount}]'
+                                 f'[Dropped: {self.dropped_amount}]')
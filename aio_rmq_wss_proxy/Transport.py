@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from logging import Logger
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from . import Utils
+from .HotPathLog import HotPathLog
+from .JsonCodec import JsonCodec
+from .Metrics import Metrics
+from .RawMessage import RawMessage
+from .ReceivedMessage import ReceivedMessage
+
+
+class Transport:
+    """
+
+    Source of messages for clients sender: messages are put to received messages queue as ReceivedMessage.
+    MainServerLoop runs consume() of every transport until it's cancelled.
+    Received bodies are decoded with codec or passed through to room's subscribers as RawMessage
+
+    """
+    # schema (msgspec Struct, dataclass, TypedDict...) to validate messages while decoding, needs msgspec
+    MESSAGE_SCHEMA = None
+
+    def __init__(self, name: str,
+                 received_messages_queue: asyncio.Queue,
+                 logger: Logger,
+                 exception_queue: asyncio.Queue,
+                 codec: Optional[JsonCodec] = None,
+                 passthrough: bool = False,
+                 passthrough_binary: bool = False,
+                 room_field: Optional[str] = None,
+                 metrics: Optional[Metrics] = None):
+        """
+        :param codec: JSON codec, by default the fastest installed library is used
+        :param passthrough: messages are not decoded, their bodies are put to the queue as RawMessage
+        and sent to room's subscribers as is
+        :param passthrough_binary: send passthrough bodies as binary frames instead of text ones
+        :param room_field: decoded message gets room it was received with as this field if the field isn't set
+        """
+        self._name = Utils.format_name(name)
+        self._logger = logger
+        self._exception_queue = exception_queue
+
+        self._log_received = HotPathLog(logger, logging.INFO)
+        self._metrics = metrics
+
+        self._received_messages_queue = received_messages_queue
+
+        self._codec = codec or JsonCodec()
+        self._typed_decoder = self._codec.typed_decoder(self.MESSAGE_SCHEMA) if self.MESSAGE_SCHEMA else None
+
+        self._passthrough = passthrough
+        self._passthrough_binary = passthrough_binary
+        self._room_field = room_field
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _check_message(self, message_json: Dict) -> str:
+        """
+        You can override this method for your own message check
+        """
+        return ''
+
+    def _parse_message(self, body: bytes) -> Optional[Dict]:
+        self._log_received('%s R < %s', self.name, body)
+
+        if self._typed_decoder:
+            message_json, err = self._typed_decoder(body)
+        else:
+            message_json, err = self._codec.loads(body), ''
+
+        if not err:
+            err = self._check_message(message_json)
+
+        if err:
+            self._logger.error(f'{self.name} R < Error: {err}. Message: {HotPathLog.truncate(body)}')
+            return None
+
+        return message_json
+
+    def _set_message_room(self, message_json: Dict, room: Optional[str]):
+        if self._room_field and room and isinstance(message_json, dict):
+            message_json.setdefault(self._room_field, room)
+
+    async def _put(self, message: Any, on_done: Optional[Callable[[], Awaitable[None]]] = None):
+        """
+        Waits while bounded received messages queue is full
+        """
+        await self._received_messages_queue.put(ReceivedMessage(message, on_done))
+
+    async def _process_message(self, body: bytes, room: Optional[str] = None,
+                               on_done: Optional[Callable[[], Awaitable[None]]] = None) -> bool:
+        """
+        :param on_done: called by clients sender when it's done with the message
+        :return: True if message is put to the queue
+        """
+        message_json = self._parse_message(body)
+
+        if message_json is None:
+            return False
+
+        self._set_message_room(message_json, room)
+
+        await self._put(message_json, on_done)
+
+        return True
+
+    def _make_raw_message(self, room: Optional[str], body: bytes) -> Optional[RawMessage]:
+        if not room:
+            self._logger.error(f'{self.name} R < Error: No room in passthrough message. '
+                               f'Message: {HotPathLog.truncate(body)}')
+            return None
+
+        self._log_received('%s R < [Room: %s] %s', self.name, room, body)
+
+        return RawMessage(room, body, self._passthrough_binary)
+
+    async def _process_body(self, body: bytes, room: Optional[str] = None) -> bool:
+        """
+        Decodes body or passes it through depending on transport's mode
+        :return: True if message is put to the queue
+        """
+        if self._metrics:
+            self._metrics.inc(Metrics.RMQ_RECEIVED)
+
+        if not self._passthrough:
+            return await self._process_message(body, room)
+
+        raw_message = self._make_raw_message(room, body)
+
+        if raw_message is None:
+            return False
+
+        await self._put(raw_message)
+
+        return True
+
+    async def consume(self):
+        """
+        Receives messages until cancelled
+        """
+        raise NotImplementedError()
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import stat
+import struct
+
+from logging import Logger
+from typing import Optional, Set
+
+from .JsonCodec import JsonCodec
+from .Metrics import Metrics
+from .Transport import Transport
+
+
+class UnixSocketTransport(Transport):
+    """
+
+    Transport receiving messages from local publishers over Unix domain socket, so edge nodes skip the broker hop.
+    Every message is a frame: room length and body length (big endian unsigned short and int),
+    utf-8 room (may be empty) and body, see pack(). Publisher's socket is not read while received messages queue
+    is full, so publishers are slowed down by the socket buffers
+
+    """
+    FRAME_HEADER = struct.Struct('>HI')
+
+    def __init__(self, path: str,
+                 received_messages_queue: asyncio.Queue,
+                 logger: Logger,
+                 exception_queue: asyncio.Queue,
+                 codec: Optional[JsonCodec] = None,
+                 passthrough: bool = False,
+                 passthrough_binary: bool = False,
+                 room_field: Optional[str] = None,
+                 max_body_size: int = 16 * 1024 * 1024,
+                 metrics: Optional[Metrics] = None,
+                 name: str = 'Unix Socket Transport'):
+        """
+        :param path: socket path, stale socket file left by previous run is replaced
+        :param room_field: decoded message gets frame's room as this field if the field isn't set
+        :param max_body_size: publisher sending a bigger message is disconnected
+        """
+        super(UnixSocketTransport, self).__init__(name, received_messages_queue, logger, exception_queue,
+                                                  codec=codec,
+                                                  passthrough=passthrough,
+                                                  passthrough_binary=passthrough_binary,
+                                                  room_field=room_field,
+                                                  metrics=metrics)
+
+        self._path = path
+        self._max_body_size = max_body_size
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @staticmethod
+    def pack(body: bytes, room: Optional[str] = None) -> bytes:
+        """
+        :return: frame to write to the socket
+        """
+        room_bytes = room.encode('utf-8') if room else b''
+
+        return UnixSocketTransport.FRAME_HEADER.pack(len(room_bytes), len(body)) + room_bytes + body
+
+    async def _handle_publisher(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        self._logger.debug(f'{self.name} Publisher Connected')
+
+        try:
+            while True:
+                room_length, body_length = self.FRAME_HEADER.unpack(await reader.readexactly(self.FRAME_HEADER.size))
+
+                if body_length > self._max_body_size:
+                    self._logger.error(f'{self.name} R < Error: Message of {body_length} bytes is too big. '
+                                       f'Disconnecting publisher')
+                    return
+
+                room = (await reader.readexactly(room_length)).decode('utf-8') if room_length else None
+
+                await self._process_body(await reader.readexactly(body_length), room)
+
+        except asyncio.IncompleteReadError:
+            self._logger.debug(f'{self.name} Publisher Disconnected')
+
+        except (ConnectionError, asyncio.CancelledError):
+            return
+
+        except Exception as ex:
+            await self._exception_queue.put((self.name, 'Error in Message', ex))
+
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _remove_stale_socket(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self._path).st_mode):
+                os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+    async def _close(self):
+        if self._server is not None:
+            self._server.close()
+
+            for writer in list(self._writers):
+                writer.close()
+
+            await self._server.wait_closed()
+            self._server = None
+
+            self._remove_stale_socket()
+
+    async def consume(self):
+        try:
+            self._remove_stale_socket()
+            self._server = await asyncio.start_unix_server(self._handle_publisher, self._path)
+
+            self._logger.warning(f'{self.name} Started [PATH: {self._path}]')
+
+            await asyncio.Future()
+
+        except asyncio.CancelledError:
+            await self._close()
+            self._logger.warning(f'{self.name} Stopped')
+
+        except Exception as ex:
+            await self._close()
+            self._logger.error(f'{self.name} Stopped because of an Error')
+            await self._exception_queue.put((self.name, 'Running Consume', ex))
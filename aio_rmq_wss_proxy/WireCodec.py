@@ -0,0 +1,103 @@
+import importlib
+
+from typing import Any, Dict, Optional
+
+from .JsonCodec import JsonCodec
+from .PreparedMessage import PreparedMessage
+
+from websockets.frames import Opcode
+
+
+class WireCodec:
+    """
+    Encoding of messages exchanged with websocket clients in the format negotiated by the connection:
+    JSON text frames, MessagePack (msgpack or msgspec) or CBOR (cbor2) binary frames
+    """
+    JSON = 'json'
+    MSGPACK = 'msgpack'
+    CBOR = 'cbor'
+
+    FORMATS = (JSON, MSGPACK, CBOR)
+
+    _shared_codecs: Dict[str, 'WireCodec'] = {}
+
+    def __init__(self, wire_format: str, json_codec: Optional[JsonCodec] = None):
+        """
+        :param wire_format: one of FORMATS
+        :param json_codec: decodes JSON messages transcoded to the format
+        """
+        if wire_format not in WireCodec.FORMATS:
+            raise ValueError(f'Unknown wire format: {wire_format}')
+
+        self._format = wire_format
+        self._json_codec = json_codec or JsonCodec()
+
+        # loads accepts bytes, dumps_bytes returns bytes sent with opcode
+        if wire_format == WireCodec.JSON:
+            self.opcode = Opcode.TEXT
+            self.loads = self._json_codec.loads
+            self.dumps_bytes = self._json_codec.dumps_bytes
+
+        elif wire_format == WireCodec.MSGPACK:
+            self.opcode = Opcode.BINARY
+
+            if JsonCodec.is_available('msgpack'):
+                msgpack = importlib.import_module('msgpack')
+                self.loads = lambda data: msgpack.unpackb(data, raw=False)
+                self.dumps_bytes = msgpack.packb
+            else:
+                msgspec = importlib.import_module('msgspec')
+                self.loads = msgspec.msgpack.decode
+                self.dumps_bytes = msgspec.msgpack.encode
+
+        else:
+            cbor2 = importlib.import_module('cbor2')
+            self.opcode = Opcode.BINARY
+            self.loads = cbor2.loads
+            self.dumps_bytes = cbor2.dumps
+
+    @staticmethod
+    def is_available(wire_format: str) -> bool:
+        if wire_format == WireCodec.MSGPACK:
+            return JsonCodec.is_available('msgpack') or JsonCodec.is_available('msgspec')
+
+        if wire_format == WireCodec.CBOR:
+            return JsonCodec.is_available('cbor2')
+
+        return wire_format == WireCodec.JSON
+
+    @staticmethod
+    def get(wire_format: str) -> 'WireCodec':
+        """
+        :return: codec of the format shared by all the connections
+        """
+        codec = WireCodec._shared_codecs.get(wire_format)
+
+        if codec is None:
+            codec = WireCodec._shared_codecs[wire_format] = WireCodec(wire_format)
+
+        return codec
+
+    @property
+    def format(self) -> str:
+        return self._format
+
+    def prepare(self, obj: Any) -> PreparedMessage:
+        return PreparedMessage(self.dumps_bytes(obj), self.opcode, obj)
+
+    def transcode(self, message: PreparedMessage) -> PreparedMessage:
+        """
+        Encodes JSON message in the format, message which isn't JSON is returned as is
+        """
+        obj = message.source
+
+        if obj is None:
+            if message.opcode != Opcode.TEXT:
+                return message
+
+            try:
+                obj = self._json_codec.loads(message.data)
+            except ValueError:
+                return message
+
+        return self.prepare(obj)
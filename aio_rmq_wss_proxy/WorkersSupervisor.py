@@ -0,0 +1,152 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from logging import Logger
+from typing import Callable, Dict
+
+from . import Utils
+from .MainServerLoop import MainServerLoop
+
+
+def _interrupt_once(signum, frame):
+    # Ctrl+C in terminal and supervisor's stop() may both interrupt the worker, the second one would break
+    # the graceful shutdown started by the first one
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def _run_worker(service_factory: Callable[[int], MainServerLoop], worker_num: int):
+    signal.signal(signal.SIGINT, _interrupt_once)
+    # forked worker inherits supervisor's handler
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    server_loop = service_factory(worker_num)
+
+    try:
+        server_loop.run()
+    except KeyboardInterrupt:
+        server_loop.cancel()
+        server_loop.run()
+    finally:
+        try:
+            server_loop.stop()
+        finally:
+            # worker exits without atexit handlers, so logging is shut down here: non-blocking handlers
+            # write out queued records (e.g. the crash traceback)
+            logging.shutdown()
+
+
+class WorkersSupervisor:
+    """
+
+    Runs N worker processes, each one with its own MainServerLoop (AsyncServer, ClientsController, ClientsSender...).
+    Workers share the listening port (AsyncServer with reuse_port=True or an inherited socket)
+    and every worker has to receive all RMQ messages, e.g. through its own queue bound to the same exchange.
+    Crashed workers are restarted. Ctrl+C or SIGTERM stops the supervisor: workers get SIGINT
+    and shut down gracefully, the ones still alive after the timeout are terminated.
+
+    """
+
+    def __init__(self, service_factory: Callable[[int], MainServerLoop],
+                 workers_amount: int,
+                 logger: Logger,
+                 restart_delay_secs: float = 1,
+                 check_interval_secs: float = 1):
+        """
+        :param service_factory: builds worker's MainServerLoop by worker number, it is called inside worker process
+        so it must be picklable (module level function) when processes are spawned instead of forked
+        """
+        self._name = Utils.format_name('Supervisor')
+
+        self._service_factory = service_factory
+        self._workers_amount = workers_amount
+
+        self._logger = logger
+
+        self._restart_delay_secs = restart_delay_secs
+        self._check_interval_secs = check_interval_secs
+
+        self._workers: Dict[int, multiprocessing.Process] = {}
+        self._stopping = False
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _start_worker(self, worker_num: int):
+        worker = multiprocessing.Process(target=_run_worker,
+                                         args=(self._service_factory, worker_num),
+                                         name=f'WS-Worker-{worker_num}',
+                                         daemon=False)
+        worker.start()
+
+        self._workers[worker_num] = worker
+        self._logger.warning(f'{self.name} Worker {worker_num} Started [PID: {worker.pid}]')
+
+    def _restart_dead_workers(self):
+        for worker_num, worker in list(self._workers.items()):
+            if worker.is_alive():
+                continue
+
+            self._logger.error(f'{self.name} Worker {worker_num} Died [PID: {worker.pid}]'
+                               f'[Exit Code: {worker.exitcode}]. Restarting')
+
+            time.sleep(self._restart_delay_secs)
+
+            if not self._stopping:
+                self._start_worker(worker_num)
+
+    def _on_terminate(self, signum, frame):
+        self._logger.warning(f'{self.name} Terminated')
+        self.stop()
+
+    def run(self):
+        self._logger.warning(f'{self.name} Started [Workers: {self._workers_amount}]')
+
+        signal.signal(signal.SIGTERM, self._on_terminate)
+
+        for worker_num in range(self._workers_amount):
+            self._start_worker(worker_num)
+
+        try:
+            while not self._stopping:
+                time.sleep(self._check_interval_secs)
+                self._restart_dead_workers()
+
+        except KeyboardInterrupt:
+            self._logger.warning(f'{self.name} Interrupted')
+
+        finally:
+            self.stop()
+
+    def stop(self, timeout_secs: float = 10):
+        """
+        Interrupts all the workers and waits for them timeout_secs in total, terminates the ones still alive
+        """
+        self._stopping = True
+
+        # stop() called again by SIGTERM handler meanwhile has nothing to do
+        workers, self._workers = self._workers, {}
+
+        if not workers:
+            return
+
+        for worker in workers.values():
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGINT)
+
+        deadline = time.monotonic() + timeout_secs
+
+        for worker in workers.values():
+            worker.join(max(deadline - time.monotonic(), 0))
+
+        for worker_num, worker in workers.items():
+            if worker.is_alive():
+                self._logger.error(f'{self.name} Worker {worker_num} is not Stopped in {timeout_secs}s. Terminating')
+                worker.terminate()
+                worker.join()
+
+        self._logger.warning(f'{self.name} Stopped')
@@ -1,9 +1,32 @@
 from .Utils import Utils
 
+from .OverflowPolicy import OverflowPolicy
+from .OutboundQueue import OutboundQueue
+from .AuthCache import AuthCache
+from .DeflateCompression import DeflateCompression
+from .HotPathLog import HotPathLog
+from .JsonCodec import JsonCodec
+from .LoopProfiler import LoopProfiler
+from .MessagesBatch import MessagesBatch
+from .Metrics import Metrics
+from .PreparedMessage import PreparedMessage
+from .RawMessage import RawMessage
+from .ReceivedMessage import ReceivedMessage
+from .ReceivedMessagesQueue import ReceivedMessagesQueue
+from .RoomsSnapshots import RoomsSnapshots
+from .RoomsTrie import RoomsTrie
+from .WireCodec import WireCodec
+
 from .AioRmqConsumer import AioRmqConsumer
 from .AsyncServer import AsyncServer
 from .AsyncServerHandler import AsyncServerHandler
 from .ClientsController import ClientsController
 from .ClientsSender import ClientsSender
+from .InMemoryTransport import InMemoryTransport
 from .MainServerLoop import MainServerLoop
+from .ReplayTransport import ReplayTransport
 from .SecuredWebsocketServerProtocol import SecuredWebsocketServerProtocol
+from .TrafficRecorder import TrafficRecorder
+from .Transport import Transport
+from .UnixSocketTransport import UnixSocketTransport
+from .WorkersSupervisor import WorkersSupervisor
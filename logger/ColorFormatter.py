@@ -23,21 +23,25 @@ BOLD_SEQ = "\033[1m"
 
 
 class ColorFormatter(Formatter):
+    SHORT_FORMAT = '%(asctime)s $COLOR%(levelname)-8s %(message)s'
+    LONG_FORMAT = '%(asctime)s $COLOR%(levelname)-8s %(message)s %(filename)+30s %(lineno)d'
 
     def __init__(self, *args, **kwargs):
         # can't do super(...) here because Formatter is an old school class
         Formatter.__init__(self, *args, **kwargs)
 
+        # formats are chosen by level, so they are prepared once instead of patching _style._fmt for every record
+        self._short_formatter = Formatter(self.SHORT_FORMAT, self.datefmt)
+        self._long_formatter = Formatter(self.LONG_FORMAT, self.datefmt)
+
     def format(self, record):
         levelname = record.levelname
         color = COLOR_SEQ % (30 + COLORS[levelname])
 
         if levelname in {'WARNING', 'CRITICAL', 'ERROR'}:
-            self._style._fmt = '%(asctime)s $COLOR%(levelname)-8s %(message)s %(filename)+30s %(lineno)d'
+            message = self._long_formatter.format(record)
         else:
-            self._style._fmt = '%(asctime)s $COLOR%(levelname)-8s %(message)s'
-
-        message = Formatter.format(self, record)
+            message = self._short_formatter.format(record)
         message = message.replace("$RESET", RESET_SEQ) \
             .replace('$BOLD', BOLD_SEQ) \
             .replace('$COLOR', color)
@@ -2,19 +2,19 @@ from logging import Formatter
 
 
 class FileFormatter(Formatter):
+    SHORT_FORMAT = '%(asctime)s %(levelname)-8s %(message)s'
+    LONG_FORMAT = '%(asctime)s %(levelname)-8s %(message)s %(filename)+30s %(lineno)d'
 
     def __init__(self, *args, **kwargs):
         # can't do super(...) here because Formatter is an old school class
         Formatter.__init__(self, *args, **kwargs)
 
-    def format(self, record):
-        levelname = record.levelname
-
-        if levelname in {'WARNING', 'CRITICAL', 'ERROR'}:
-            self._style._fmt = '%(asctime)s %(levelname)-8s %(message)s %(filename)+30s %(lineno)d'
-        else:
-            self._style._fmt = '%(asctime)s %(levelname)-8s %(message)s'
+        # formats are chosen by level, so they are prepared once instead of patching _style._fmt for every record
+        self._short_formatter = Formatter(self.SHORT_FORMAT, self.datefmt)
+        self._long_formatter = Formatter(self.LONG_FORMAT, self.datefmt)
 
-        message = Formatter.format(self, record)
+    def format(self, record):
+        if record.levelname in {'WARNING', 'CRITICAL', 'ERROR'}:
+            return self._long_formatter.format(record)
 
-        return message
+        return self._short_formatter.format(record)
@@ -0,0 +1,28 @@
+import logging.handlers
+
+from typing import Optional
+
+
+class ListenerQueueHandler(logging.handlers.QueueHandler):
+    """
+
+    QueueHandler stopping the QueueListener of its queue when it's closed, so logging.shutdown()
+    writes out queued records also in processes exiting without atexit (multiprocessing workers)
+
+    """
+
+    def __init__(self, records_queue):
+        super(ListenerQueueHandler, self).__init__(records_queue)
+        self.listener: Optional[logging.handlers.QueueListener] = None
+
+    def stop_listener(self):
+        """
+        Writes out queued records and stops the writing thread
+        """
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def close(self):
+        self.stop_listener()
+        super(ListenerQueueHandler, self).close()
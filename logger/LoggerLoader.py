@@ -1,18 +1,30 @@
+import atexit
 import logging.config
+import logging.handlers
 import os
+import queue
 
 from logging import Logger
+from typing import Optional
 
 from logger.ColorFormatter import ColorFormatter
 from logger.FileFormatter import FileFormatter
+from logger.ListenerQueueHandler import ListenerQueueHandler
 
 
 class LoggerLoader:
 
-    def __init__(self, filename: str, level: str, log_dir: str = '/var/log/'):
+    def __init__(self, filename: str, level: str, log_dir: str = '/var/log/', non_blocking: bool = True):
+        """
+        :param non_blocking: records are put to a queue and written by file and console handlers
+        in a separate thread (QueueHandler / QueueListener), so I/O never blocks the event loop
+        """
         self._logger_name = 'Main'
         self._level = level
 
+        self._non_blocking = non_blocking
+        self._queue_handler: Optional[ListenerQueueHandler] = None
+
         self._filename = filename
         self._log_directory = log_dir
         self._filepath = f'{self._log_directory}{self._filename}'
@@ -25,7 +37,12 @@ class LoggerLoader:
 
         self._configure_logging()
 
+        atexit.register(self.stop)
+
     def _configure_logging(self):
+        # queued records are written out by the current handlers before they are replaced
+        self.stop()
+
         logging.config.dictConfig({
             'version': 1,
             'disable_existing_loggers': False,
@@ -61,6 +78,32 @@ class LoggerLoader:
             }
         })
 
+        if self._non_blocking:
+            self._start_queue_listener()
+
+    def _start_queue_listener(self):
+        logger = logging.getLogger(self._logger_name)
+        handlers = list(logger.handlers)
+        records_queue = queue.SimpleQueue()
+
+        for handler in handlers:
+            logger.removeHandler(handler)
+
+        self._queue_handler = ListenerQueueHandler(records_queue)
+        self._queue_handler.listener = logging.handlers.QueueListener(records_queue, *handlers,
+                                                                      respect_handler_level=True)
+        self._queue_handler.listener.start()
+
+        logger.addHandler(self._queue_handler)
+
+    def stop(self):
+        """
+        Writes out queued records and stops the writing thread
+        """
+        if self._queue_handler:
+            self._queue_handler.stop_listener()
+            self._queue_handler = None
+
     def change_logger_level(self, level: str):
         if level not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
             raise Exception(f'Unknown Logger Level {level}')